@@ -1,9 +1,34 @@
 import os
 import json
-from typing import Dict, List, Set, Any, Optional
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Set, Any, Optional
 
 from path_utils import normalize_path
 
+# orjson es opcional: si está instalado se usa para leer/escribir la configuración
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _dumps(obj: Any) -> bytes:
+    """Serializa la configuración a JSON codificado en UTF-8"""
+    # Sin sangría en ambos casos, para que el archivo tenga la misma forma con o
+    # sin orjson: no se edita a mano y así es más pequeño y rápido de generar
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def _loads(raw: bytes) -> Any:
+    """Deserializa la configuración desde JSON en bytes"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+# Número máximo de carpetas recientes que se conservan
+MAX_RECENT_FOLDERS = 10
+
 class ConfigManager:
     """Gestor de configuración para la aplicación LLM Export Tool"""
     
@@ -12,8 +37,8 @@ class ConfigManager:
         # Datos de estado
         self.current_folder = ""
         self.last_export_location = ""
-        self.recent_folders = []
-        self.selections = {}  # {carpeta: [archivos_seleccionados]}
+        self._recent: "OrderedDict[str, str]" = OrderedDict()  # {ruta_normalizada: ruta_absoluta}, más reciente primero
+        self.selections: Dict[str, Set[str]] = {}  # {carpeta: conjunto de archivos seleccionados}
         self.language = "en"
         
         # Filtros por carpeta
@@ -21,30 +46,49 @@ class ConfigManager:
         
         # Archivo de configuración en el directorio del usuario
         self.config_file = os.path.join(os.path.expanduser("~"), ".llm_export_config.json")
+        
+        # Escritura diferida: los cambios marcan la configuración como pendiente
+        self._dirty = False
+        self._batch_depth = 0
+        self._save_scheduler: Optional[Callable[[], None]] = None
+    
+    @property
+    def recent_folders(self) -> List[str]:
+        """Carpetas recientes, de la más reciente a la más antigua"""
+        return list(self._recent.values())
+    
+    @recent_folders.setter
+    def recent_folders(self, folders: List[str]) -> None:
+        self._recent = OrderedDict((normalize_path(path), path) for path in folders)
     
     def load_config(self) -> None:
         """Carga la configuración guardada desde el archivo JSON"""
         try:
             if os.path.exists(self.config_file):
-                with open(self.config_file, 'r') as f:
-                    config = json.load(f)
+                # Leer el archivo completo como bytes y decodificar una sola vez
+                with open(self.config_file, 'rb') as f:
+                    raw = f.read()
+                config = _loads(raw)
                 
                 # Normalizar rutas de carpetas recientes para eliminar duplicados
                 raw_recent_folders = config.get('recent_folders', [])
                 normalized_paths = {}
                 
+                # Directorio de trabajo obtenido una sola vez (abspath lo consulta en cada llamada)
+                cwd = os.getcwd()
+                
                 # Eliminar duplicados manteniendo el orden y convirtiendo a rutas absolutas
                 for path in raw_recent_folders:
                     try:
                         # Convertir a ruta absoluta (si no lo es ya)
-                        abs_path = os.path.abspath(path)
+                        abs_path = os.path.normpath(os.path.join(cwd, path))
                         normalized_paths[normalize_path(abs_path)] = abs_path
                     except Exception:
                         # Si falla la conversión a ruta absoluta, ignorar esta entrada
                         pass
                 
                 # Mantener solo las rutas originales absolutas, sin duplicados
-                self.recent_folders = list(normalized_paths.values())
+                self._recent = OrderedDict(normalized_paths)
                 
                 self.last_export_location = config.get('last_export_location', '')
                 
@@ -53,11 +97,11 @@ class ConfigManager:
                 self.selections = {}
                 for path, selected in selections_orig.items():
                     try:
-                        abs_path = os.path.abspath(path)
-                        self.selections[abs_path] = selected
+                        abs_path = os.path.normpath(os.path.join(cwd, path))
+                        self.selections[abs_path] = set(selected)
                     except Exception:
                         # Si no se puede convertir, usar la ruta original
-                        self.selections[path] = selected
+                        self.selections[path] = set(selected)
                 
                 # Cargar preferencia de idioma
                 language = config.get('language')
@@ -69,21 +113,84 @@ class ConfigManager:
         except Exception as e:
             print(f"Error al cargar la configuración: {e}")
     
-    def save_config(self) -> None:
-        """Guarda la configuración en el archivo JSON"""
+    def save_config(self) -> bool:
+        """
+        Guarda la configuración en el archivo JSON
+        
+        Returns:
+            bool: True si el archivo se escribió correctamente
+        """
         config = {
             'recent_folders': self.recent_folders,
             'last_export_location': self.last_export_location,
-            'selections': self.selections,
+            # Los conjuntos se convierten a listas ordenadas solo al serializar
+            'selections': {folder: sorted(paths) for folder, paths in self.selections.items()},
             'language': self.language,
             'folder_filters': self.folder_filters
         }
         
+        tmp_file = self.config_file + ".tmp"
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(config, f, indent=4)
+            # Serializar de una vez para escribir el archivo en una sola llamada
+            data = _dumps(config)
+            
+            # Escribir en un archivo temporal y reemplazar de forma atómica,
+            # para no dejar la configuración a medias si algo falla. fsync lleva
+            # los datos al disco antes del renombrado: sin él, tras un corte de
+            # luz el renombrado podría persistir antes que el contenido
+            with open(tmp_file, 'wb', buffering=1 << 16) as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.config_file)
         except Exception as e:
             print(f"Error al guardar la configuración: {e}")
+            # No dejar el temporal a medio escribir junto a la configuración
+            try:
+                os.remove(tmp_file)
+            except OSError:
+                pass
+            return False
+        return True
+    
+    def set_save_scheduler(self, scheduler: Optional[Callable[[], None]]) -> None:
+        """
+        Registra la función que programa una escritura diferida de la configuración
+        
+        Args:
+            scheduler: Función sin argumentos que debe terminar llamando a flush()
+                (p. ej. el start de un QTimer de disparo único). Con None, cada
+                cambio se guarda inmediatamente.
+        """
+        self._save_scheduler = scheduler
+    
+    def flush(self) -> None:
+        """Escribe la configuración solo si hay cambios pendientes"""
+        # Si la escritura falla los cambios siguen pendientes y se reintentan
+        # en la siguiente llamada (como mínimo, al cerrar la aplicación)
+        if self._dirty and self.save_config():
+            self._dirty = False
+    
+    @contextmanager
+    def batched(self) -> Iterator[None]:
+        """Agrupa varios cambios y los escribe una sola vez al salir del bloque"""
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.flush()
+    
+    def _mark_dirty(self) -> None:
+        """Marca la configuración como modificada y programa su escritura"""
+        self._dirty = True
+        if self._batch_depth:
+            return
+        if self._save_scheduler is None:
+            self.flush()
+        else:
+            self._save_scheduler()
     
     def add_recent_folder(self, folder_path: str) -> None:
         """
@@ -98,19 +205,17 @@ class ConfigManager:
         # Normalizar la ruta para comparación
         normalized_path = normalize_path(folder_path)
         
-        # Verificar si ya existe
-        normalized_recent_folders = [normalize_path(path) for path in self.recent_folders]
-        if normalized_path in normalized_recent_folders:
-            # Eliminar la entrada existente (podría tener otro formato de separador)
-            index = normalized_recent_folders.index(normalized_path)
-            self.recent_folders.pop(index)
+        # Eliminar la entrada existente (podría tener otro formato de separador)
+        self._recent.pop(normalized_path, None)
         
-        # Añadir al inicio y limitar a 10 carpetas
-        self.recent_folders.insert(0, folder_path)
-        self.recent_folders = self.recent_folders[:10]
+        # Añadir al inicio y limitar a MAX_RECENT_FOLDERS carpetas
+        self._recent[normalized_path] = folder_path
+        self._recent.move_to_end(normalized_path, last=False)
+        while len(self._recent) > MAX_RECENT_FOLDERS:
+            self._recent.popitem(last=True)
         
         # Guardar configuración
-        self.save_config()
+        self._mark_dirty()
     
     def set_current_folder(self, folder_path: str) -> None:
         """
@@ -122,18 +227,17 @@ class ConfigManager:
         self.current_folder = folder_path
         self.add_recent_folder(folder_path)
     
-    def save_selection(self, selected_paths: Set[str]) -> None:
+    def save_selection(self) -> None:
         """
         Guarda la selección actual para la carpeta abierta
         
-        Args:
-            selected_paths: Conjunto de rutas seleccionadas
+        El conjunto devuelto por get_selection ya se modificó en su sitio;
+        basta con programar la escritura (la lista se genera al serializar).
         """
         if self.current_folder:
-            self.selections[self.current_folder] = list(selected_paths)
-            self.save_config()
+            self._mark_dirty()
     
-    def get_selection(self, folder_path: str) -> List[str]:
+    def get_selection(self, folder_path: str) -> Set[str]:
         """
         Obtiene la selección guardada para una carpeta
         
@@ -141,9 +245,11 @@ class ConfigManager:
             folder_path: Ruta de la carpeta
             
         Returns:
-            Lista de rutas seleccionadas o lista vacía si no hay selección
+            El conjunto de rutas seleccionadas que guarda la configuración
+            (vacío si no hay selección); quien lo modifique debe llamar a
+            save_selection
         """
-        return self.selections.get(folder_path, [])
+        return self.selections.setdefault(folder_path, set())
     
     def set_folder_filters(self, folder_path: str, include_patterns: str, exclude_patterns: str) -> None:
         """
@@ -158,7 +264,7 @@ class ConfigManager:
             "include_patterns": include_patterns,
             "exclude_patterns": exclude_patterns
         }
-        self.save_config()
+        self._mark_dirty()
     
     def get_folder_filters(self, folder_path: str) -> Dict[str, str]:
         """
@@ -184,7 +290,7 @@ class ConfigManager:
         """
         if language in ('en', 'es'):
             self.language = language
-            self.save_config()
+            self._mark_dirty()
     
     def set_export_location(self, location: str) -> None:
         """
@@ -194,4 +300,4 @@ class ConfigManager:
             location: Ruta del directorio de exportación
         """
         self.last_export_location = location
-        self.save_config()
\ No newline at end of file
+        self._mark_dirty()
\ No newline at end of file
@@ -1,105 +1,156 @@
 import os
-from typing import Set, List, Dict, Optional
+import codecs
+import hashlib
+import mmap
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Callable, Deque, Iterator, Set, List, Dict, Optional, Tuple, Union
 
+# Tamaño de bloque para copiar archivos a la exportación
+COPY_BUFFER_SIZE = 1 << 20
 
-def generate_export_content(base_folder: str, selected_paths: Set[str]) -> str:
+# Lectura anticipada: hilos, archivos en vuelo y tamaño máximo leído de una vez
+PREFETCH_WORKERS = 8
+PREFETCH_WINDOW = 16
+PREFETCH_MAX_SIZE = COPY_BUFFER_SIZE
+
+# Tamaño máximo de un archivo exportado; los mayores se omiten con un aviso
+MAX_EXPORT_FILE_SIZE = 2 << 20
+
+# Bytes iniciales examinados para detectar archivos binarios
+BINARY_SNIFF_SIZE = 4096
+
+# Marcador escrito en lugar del contenido de un archivo binario
+BINARY_MARKER = b"[Archivo binario omitido]"
+
+# Separador de encabezados de archivo (formato Gitingest), ya codificado
+SEPARATOR = b"=" * 48
+
+
+def generate_export_content(base_folder: str, selected_paths: Set[str], out_fp: BinaryIO) -> None:
     """
-    Genera el contenido exportado en formato LLM-friendly
+    Genera el contenido exportado en formato LLM-friendly y lo escribe en out_fp
+    
+    El contenido de cada archivo se copia directamente a la salida, sin
+    acumular la exportación completa en memoria.
     
     Args:
         base_folder: Carpeta base para resolución de rutas
         selected_paths: Conjunto de rutas seleccionadas (relativas a base_folder)
-        
-    Returns:
-        str: Contenido formateado para exportación
+        out_fp: Archivo binario abierto donde se escribe la exportación (UTF-8)
     """
-    # Formato similar a Gitingest
-    result = ["Directory structure:"]
+    # Ordenar una sola vez; ambas secciones recorren las rutas en este orden
+    sorted_paths = sorted(selected_paths)
     
-    # Generar estructura de directorios
-    dir_structure = _generate_directory_structure(base_folder, selected_paths)
-    result.append(dir_structure)
-    result.append("")  # Línea en blanco
+    # Formato similar a Gitingest
+    out_fp.write(b"Directory structure:\n")
     
-    # Generar contenido de archivos
-    file_contents = _generate_file_contents(base_folder, selected_paths)
-    result.append(file_contents)
+    # Escribir estructura de directorios, una línea por entrada
+    _write_directory_structure(base_folder, sorted_paths, out_fp)
+    out_fp.write(b"\n")  # Línea en blanco
     
-    return "\n".join(result)
+    # Escribir contenido de archivos
+    _write_file_contents(base_folder, sorted_paths, out_fp)
 
 
-def _generate_directory_structure(base_folder: str, selected_paths: Set[str]) -> str:
+def export_fingerprint(base_folder: str, selected_paths: Set[str]) -> bytes:
     """
-    Genera representación en árbol de la estructura de directorios
+    Calcula una huella de la exportación sin leer el contenido de los archivos
+    
+    Combina la carpeta base, la selección ordenada y la fecha de modificación
+    y el tamaño de cada archivo: si la huella coincide con la de una
+    exportación anterior, su resultado sigue siendo válido.
     
     Args:
         base_folder: Carpeta base para resolución de rutas
-        selected_paths: Conjunto de rutas seleccionadas
+        selected_paths: Conjunto de rutas seleccionadas (relativas a base_folder)
         
     Returns:
-        str: Representación en texto de la estructura de directorios
+        bytes: Resumen BLAKE2b de la exportación
+    """
+    digest = hashlib.blake2b(os.path.normpath(base_folder).encode('utf-8', 'surrogateescape'))
+    base_prefix = os.path.join(base_folder, "")
+    for rel_path in sorted(selected_paths):
+        try:
+            st = os.stat(base_prefix + rel_path)
+            signature = f"{st.st_mtime_ns}:{st.st_size}"
+        except OSError:
+            signature = "-"
+        digest.update(f"\0{rel_path}\0{signature}".encode('utf-8', 'surrogateescape'))
+    return digest.digest()
+
+
+def _write_directory_structure(base_folder: str, sorted_paths: List[str], out_fp: BinaryIO) -> None:
+    """
+    Escribe la representación en árbol de la estructura de directorios
+    
+    Cada línea se escribe en out_fp según se genera, terminada en salto de
+    línea, sin reunir antes la estructura completa en una cadena.
+    
+    Args:
+        base_folder: Carpeta base para resolución de rutas
+        sorted_paths: Rutas seleccionadas, ya ordenadas
+        out_fp: Archivo binario abierto donde se escribe la estructura
     """
-    lines = []
+    def write_line(line: str) -> None:
+        out_fp.write((line + "\n").encode('utf-8'))
     
     # Nombre de la carpeta base
     base_name = os.path.basename(base_folder)
-    lines.append(f"└── {base_name}/")
+    write_line(f"└── {base_name}/")
     
-    # Organizar rutas por nivel para construir el árbol
-    paths_by_level = {}
-    for path in sorted(selected_paths):
-        parts = path.split(os.sep)
-        level = len(parts)
-        
-        if level not in paths_by_level:
-            paths_by_level[level] = []
-        
-        paths_by_level[level].append(path)
+    # Directorios que contienen alguna ruta seleccionada, calculados una sola vez;
+    # forman los nodos intermedios del árbol y determinan qué entradas son carpetas
+    dir_paths: Set[str] = set()
+    for path in sorted_paths:
+        parent = os.path.dirname(path)
+        while parent and parent not in dir_paths:
+            dir_paths.add(parent)
+            parent = os.path.dirname(parent)
+    
+    tree_paths = dir_paths.union(sorted_paths)
+    sep = os.sep
+    basename_map = {p: p.rsplit(sep, 1)[-1] for p in tree_paths}
     
-    # Construir árbol de forma iterativa por niveles
-    _build_tree_structure(lines, paths_by_level, base_folder, "", 1, "    ")
+    # Agrupar rutas por directorio padre en una sola pasada
+    children_by_parent: Dict[str, List[str]] = defaultdict(list)
+    for path in tree_paths:
+        children_by_parent[os.path.dirname(path)].append(path)
     
-    return "\n".join(lines)
+    # Construir árbol a partir de la raíz
+    _build_tree_structure(write_line, children_by_parent, dir_paths, basename_map, "", "    ")
 
 
 def _build_tree_structure(
-    lines: List[str], 
-    paths_by_level: Dict[int, List[str]], 
-    base_folder: str, 
+    write_line: Callable[[str], None], 
+    children_by_parent: Dict[str, List[str]], 
+    dir_paths: Set[str], 
+    basename_map: Dict[str, str], 
     parent_path: str, 
-    level: int,
     prefix: str = ""
 ) -> None:
     """
     Construye la estructura de árbol recursivamente
     
     Args:
-        lines: Lista de líneas de salida
-        paths_by_level: Rutas organizadas por nivel de profundidad
-        base_folder: Carpeta base para resolución de rutas
+        write_line: Función que escribe una línea de salida
+        children_by_parent: Rutas agrupadas por su directorio padre
+        dir_paths: Rutas que son directorios
+        basename_map: Nombre base de cada ruta
         parent_path: Ruta padre actual
-        level: Nivel actual en la jerarquía
         prefix: Prefijo para la indentación actual
     """
-    if level not in paths_by_level:
-        return
-    
-    # Filtrar elementos en este nivel que pertenecen al padre actual
-    current_level_items = []
-    for path in paths_by_level[level]:
-        # Verificar si este elemento pertenece directamente al padre actual
-        path_parent = os.path.dirname(path)
-        if path_parent == parent_path:
-            current_level_items.append(path)
+    # Elementos que pertenecen directamente al padre actual
+    current_level_items = children_by_parent.get(parent_path)
     
-    # Si no hay elementos en este nivel para este padre, salir
+    # Si no hay elementos para este padre, salir
     if not current_level_items:
         return
     
     # Ordenar: primero carpetas, luego archivos
     current_level_items.sort(key=lambda p: (
-        not os.path.isdir(os.path.join(base_folder, p)), 
-        os.path.basename(p).lower()
+        p not in dir_paths, 
+        basename_map[p].lower()
     ))
     
     # Índice para el último elemento
@@ -114,16 +165,16 @@ def _build_tree_structure(
         item_prefix += "└── " if is_last else "├── "
         
         # Nombre base del elemento
-        item_name = os.path.basename(item)
+        item_name = basename_map[item]
         
         # Es un directorio?
-        is_dir = os.path.isdir(os.path.join(base_folder, item))
+        is_dir = item in dir_paths
         
         # Añadir a la salida
         if is_dir:
-            lines.append(f"{item_prefix}{item_name}/")
+            write_line(f"{item_prefix}{item_name}/")
         else:
-            lines.append(f"{item_prefix}{item_name}")
+            write_line(f"{item_prefix}{item_name}")
         
         # Recursión para subdirectorios
         if is_dir:
@@ -131,45 +182,203 @@ def _build_tree_structure(
             child_prefix = prefix
             child_prefix += "    " if is_last else "│   "
             
-            # Procesar nivel siguiente para este directorio
-            _build_tree_structure(lines, paths_by_level, base_folder, item, level + 1, child_prefix)
+            # Procesar los hijos de este directorio
+            _build_tree_structure(write_line, children_by_parent, dir_paths, basename_map, item, child_prefix)
 
 
-def _generate_file_contents(base_folder: str, selected_paths: Set[str]) -> str:
+def _write_file_contents(base_folder: str, sorted_paths: List[str], out_fp: BinaryIO) -> None:
     """
-    Genera el contenido de archivos seleccionados
+    Escribe el contenido de los archivos seleccionados en out_fp
+    
+    Los archivos pequeños se leen por adelantado en un pool de hilos mientras
+    se escriben los anteriores; la salida conserva el orden de sorted_paths.
     
     Args:
         base_folder: Carpeta base para resolución de rutas
-        selected_paths: Conjunto de rutas seleccionadas
+        sorted_paths: Rutas seleccionadas, ya ordenadas
+        out_fp: Archivo binario abierto donde se escribe el contenido
+    """
+    first = True
+    
+    # Prefijo de la carpeta base calculado una sola vez
+    base_prefix = os.path.join(base_folder, "")
+    
+    with ThreadPoolExecutor(max_workers=PREFETCH_WORKERS) as executor:
+        # Procesar archivos seleccionados
+        for rel_path, future in _iter_prefetched(executor, base_prefix, sorted_paths):
+            full_path = base_prefix + rel_path
+            
+            # Solo si falla la lectura se comprueba si es un directorio
+            read_error = None
+            try:
+                data = future.result()
+            except Exception as e:
+                # Omitir directorios
+                if os.path.isdir(full_path):
+                    continue
+                data = None
+                read_error = e
+            
+            # Línea en blanco adicional entre archivos
+            if not first:
+                out_fp.write(b"\n")
+            first = False
+            
+            # Añadir separador y encabezado de archivo - formato Gitingest
+            out_fp.write(SEPARATOR + f"\nFile: {rel_path}\n".encode('utf-8') + SEPARATOR + b"\n")
+            
+            if read_error is not None:
+                out_fp.write(f"[Error al leer el archivo: {read_error}]".encode('utf-8'))
+            elif data is not None:
+                if _is_binary(data[:BINARY_SNIFF_SIZE]):
+                    out_fp.write(BINARY_MARKER)
+                else:
+                    _write_utf8(data, out_fp)
+            else:
+                # Archivo grande: se proyecta en memoria y se copia por bloques
+                # directamente desde la caché de páginas, sin cargarlo entero
+                try:
+                    with open(full_path, 'rb') as src:
+                        size = os.fstat(src.fileno()).st_size
+                        if size > MAX_EXPORT_FILE_SIZE:
+                            # Un log o binario enorme seleccionado por error no se vuelca
+                            out_fp.write(f"[Archivo omitido: {size} bytes]".encode('utf-8'))
+                        else:
+                            with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                                if _is_binary(mapped[:BINARY_SNIFF_SIZE]):
+                                    out_fp.write(BINARY_MARKER)
+                                else:
+                                    _copy_utf8(mapped, out_fp)
+                except Exception as e:
+                    out_fp.write(f"[Error al leer el archivo: {e}]".encode('utf-8'))
+            
+            # Separador entre archivos
+            out_fp.write(b"\n\n")
+
+
+def _iter_prefetched(
+    executor: ThreadPoolExecutor, 
+    base_prefix: str, 
+    sorted_paths: List[str]
+) -> Iterator[Tuple[str, "Future[Optional[bytes]]"]]:
+    """
+    Encola la lectura de los archivos manteniendo una ventana acotada
+    
+    Args:
+        executor: Pool de hilos donde se ejecutan las lecturas
+        base_prefix: Carpeta base terminada en separador
+        sorted_paths: Rutas seleccionadas, ya ordenadas
+        
+    Yields:
+        Tuplas (ruta relativa, futuro con el contenido) en el orden de sorted_paths
+    """
+    window: Deque[Tuple[str, "Future[Optional[bytes]]"]] = deque()
+    for rel_path in sorted_paths:
+        window.append((rel_path, executor.submit(_read_small_file, base_prefix + rel_path)))
+        # Limitar la memoria retenida a PREFETCH_WINDOW archivos pequeños
+        if len(window) >= PREFETCH_WINDOW:
+            yield window.popleft()
+    while window:
+        yield window.popleft()
+
+
+def _read_small_file(full_path: str) -> Optional[bytes]:
+    """
+    Lee un archivo completo si no supera PREFETCH_MAX_SIZE
+    
+    Args:
+        full_path: Ruta absoluta del archivo
         
     Returns:
-        str: Contenido formateado de los archivos
+        Contenido del archivo, o None si es grande y debe copiarse por bloques
+    """
+    # Sin búfer: el contenido se lee de una vez, sin copia intermedia
+    with open(full_path, 'rb', buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        if size > PREFETCH_MAX_SIZE:
+            return None
+        if not size:
+            # Algunos archivos especiales informan tamaño 0 aunque tengan contenido
+            return f.readall()
+        # Una sola llamada read del tamaño conocido (os.read sobre el descriptor)
+        return f.read(size)
+
+
+def _is_binary(head: bytes) -> bool:
     """
-    content = []
+    Determina si un archivo es binario a partir de sus primeros bytes
     
-    # Procesar archivos seleccionados
-    for rel_path in sorted(selected_paths):
-        full_path = os.path.join(base_folder, rel_path)
+    Args:
+        head: Primeros bytes del archivo (hasta BINARY_SNIFF_SIZE)
         
-        # Omitir directorios
-        if os.path.isdir(full_path):
-            continue
+    Returns:
+        bool: True si contiene algún byte NUL, que no aparece en texto UTF-8
+    """
+    return b"\x00" in head
+
+
+def _write_utf8(data: bytes, out_fp: BinaryIO) -> None:
+    """
+    Escribe data en out_fp garantizando que la salida sea UTF-8 válido
+    
+    Args:
+        data: Contenido completo de un archivo
+        out_fp: Archivo binario de destino
+    """
+    if not data.isascii():
+        try:
+            data.decode('utf-8')
+        except UnicodeDecodeError:
+            data = data.decode('utf-8', errors='replace').encode('utf-8')
+    out_fp.write(data)
+
+
+def _copy_utf8(src: Union[BinaryIO, mmap.mmap], out_fp: BinaryIO) -> None:
+    """
+    Copia src en out_fp garantizando que la salida sea UTF-8 válido
+    
+    Los bloques válidos se escriben tal cual, sin decodificar ni recodificar.
+    A partir del primer byte inválido se decodifica con errors='replace',
+    igual que una lectura en modo texto.
+    
+    Args:
+        src: Archivo binario de origen o proyección mmap
+        out_fp: Archivo binario de destino
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    
+    while True:
+        chunk = src.read(COPY_BUFFER_SIZE)
+        if not chunk:
+            break
+        
+        # Bytes de una secuencia multibyte incompleta del bloque anterior
+        pending = decoder.getstate()[0]
         
-        # Añadir separador y encabezado de archivo - formato Gitingest
-        content.append("=" * 48)
-        content.append(f"File: {rel_path}")
-        content.append("=" * 48)
+        # Caso habitual: texto ASCII sin bytes pendientes, se copia directamente
+        if not pending and chunk.isascii():
+            out_fp.write(chunk)
+            continue
         
-        # Leer contenido del archivo
         try:
-            with open(full_path, 'r', encoding='utf-8', errors='replace') as f:
-                file_content = f.read()
-            content.append(file_content)
-        except Exception as e:
-            content.append(f"[Error al leer el archivo: {e}]")
+            decoder.decode(chunk)
+        except UnicodeDecodeError:
+            # Contenido no UTF-8: decodificar con reemplazo el resto del archivo
+            fallback = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            while chunk:
+                out_fp.write(fallback.decode(pending + chunk).encode('utf-8'))
+                pending = b""
+                chunk = src.read(COPY_BUFFER_SIZE)
+            out_fp.write(fallback.decode(b"", final=True).encode('utf-8'))
+            return
         
-        # Separador entre archivos
-        content.append("\n")
+        # Escribir todo salvo los bytes que quedan pendientes para el siguiente bloque
+        data = pending + chunk
+        buffered = decoder.getstate()[0]
+        out_fp.write(data[:len(data) - len(buffered)])
     
-    return "\n".join(content)
\ No newline at end of file
+    # Secuencia incompleta al final del archivo
+    tail = decoder.getstate()[0]
+    if tail:
+        out_fp.write(tail.decode('utf-8', errors='replace').encode('utf-8'))
+
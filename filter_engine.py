@@ -1,8 +1,14 @@
 import os
-import fnmatch
-from typing import List, Dict, Set, Callable, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Dict, Set, Callable, Optional
 
-from path_utils import matches_pattern, normalize_path, is_subpath
+from path_utils import PatternMatcher, get_pattern_matcher, normalize_path
+
+# Hilos que listan directorios en paralelo al reconstruir la caché de filtros
+SCAN_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Directorios por nivel a partir de los cuales se listan en paralelo
+SCAN_MIN_PARALLEL = 8
 
 class FilterEngine:
     """
@@ -14,7 +20,10 @@ class FilterEngine:
         """Inicializa un nuevo motor de filtro"""
         self.include_patterns = []
         self.exclude_patterns = []
+        self._include: Optional[PatternMatcher] = None  # Patrones preparados para comprobar rutas
+        self._exclude: Optional[PatternMatcher] = None
         self._visible_items = set()  # Cache de items visibles
+        self._visible_ancestors = set()  # Directorios que contienen algún item visible
         self._base_path = ""
     
     def set_base_path(self, path: str) -> None:
@@ -35,6 +44,7 @@ class FilterEngine:
             patterns: Cadena de patrones separados por coma
         """
         self.include_patterns = self._parse_patterns(patterns)
+        self._include = get_pattern_matcher(tuple(self.include_patterns))
         self._refresh_cache()
     
     def set_exclude_patterns(self, patterns: str) -> None:
@@ -45,6 +55,43 @@ class FilterEngine:
             patterns: Cadena de patrones separados por coma
         """
         self.exclude_patterns = self._parse_patterns(patterns)
+        self._exclude = get_pattern_matcher(tuple(self.exclude_patterns))
+        self._refresh_cache()
+    
+    def set_patterns(self, include_patterns: str, exclude_patterns: str) -> bool:
+        """
+        Establece ambos filtros con una sola reconstrucción de la caché
+        
+        Si los patrones no cambian respecto a los actuales no se recorre el disco.
+        
+        Args:
+            include_patterns: Patrones de inclusión separados por coma
+            exclude_patterns: Patrones de exclusión separados por coma
+            
+        Returns:
+            bool: True si los filtros han cambiado
+        """
+        if (self._parse_patterns(include_patterns) == self.include_patterns
+                and self._parse_patterns(exclude_patterns) == self.exclude_patterns):
+            return False
+        
+        self.configure(self._base_path, include_patterns, exclude_patterns)
+        return True
+    
+    def configure(self, base_path: str, include_patterns: str, exclude_patterns: str) -> None:
+        """
+        Establece la ruta base y ambos filtros con una sola reconstrucción de la caché
+        
+        Args:
+            base_path: Ruta base para filtrado
+            include_patterns: Patrones de inclusión separados por coma
+            exclude_patterns: Patrones de exclusión separados por coma
+        """
+        self._base_path = base_path
+        self.include_patterns = self._parse_patterns(include_patterns)
+        self.exclude_patterns = self._parse_patterns(exclude_patterns)
+        self._include = get_pattern_matcher(tuple(self.include_patterns))
+        self._exclude = get_pattern_matcher(tuple(self.exclude_patterns))
         self._refresh_cache()
     
     def is_visible(self, path: str) -> bool:
@@ -64,16 +111,8 @@ class FilterEngine:
         # Normalizar la ruta para el sistema actual
         norm_path = normalize_path(path)
         
-        # Comprobar si es exactamente uno de los items cacheados como visibles
-        if norm_path in self._visible_items:
-            return True
-        
-        # Comprobar si es padre de algún item visible
-        for visible_item in self._visible_items:
-            if is_subpath(norm_path, visible_item):
-                return True
-        
-        return False
+        # Visible si es uno de los items cacheados o un directorio que contiene alguno
+        return norm_path in self._visible_items or norm_path in self._visible_ancestors
     
     def _parse_patterns(self, pattern_str: str) -> List[str]:
         """
@@ -96,78 +135,125 @@ class FilterEngine:
         Reconstruye la caché de items visibles según los filtros actuales
         """
         self._visible_items = set()
+        self._visible_ancestors = set()
         
         # Si no hay path base, no podemos aplicar filtros
         if not self._base_path:
             return
         
-        # Si no hay patrones de inclusión, inicialmente incluimos todo
-        if not self.include_patterns:
-            self._collect_all_files(self._base_path)
-        else:
-            # Sino, solo incluimos lo que coincide con los patrones
-            self._collect_matching_files(self._base_path, self.include_patterns)
+        # Sin patrones todo es visible y la caché no se consulta
+        if self._include is None and self._exclude is None:
+            return
         
-        # Luego excluimos lo que coincide con los patrones de exclusión
-        if self.exclude_patterns:
-            self._exclude_matching_files(self._base_path, self.exclude_patterns)
-    
-    def _collect_all_files(self, dir_path: str) -> None:
-        """
-        Recoge recursivamente todos los archivos bajo un directorio
+        include = self._include.match if self._include is not None else None
+        exclude = self._exclude.match if self._exclude is not None else None
         
-        Args:
-            dir_path: Directorio a recorrer
-        """
-        try:
-            for root, dirs, files in os.walk(dir_path):
-                for file in files:
-                    full_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(full_path, self._base_path)
-                    self._visible_items.add(normalize_path(rel_path))
-        except Exception:
-            # Ignorar errores de acceso a archivos/directorios
-            pass
+        # Un único recorrido evalúa inclusión y exclusión para cada archivo;
+        # los directorios excluidos se descartan sin descender en ellos
+        for rel_path in self._iter_files(self._base_path, exclude):
+            if include is not None and not include(rel_path):
+                continue
+            if exclude is not None and exclude(rel_path):
+                continue
+            self._visible_items.add(rel_path)
+        
+        self._collect_ancestors()
     
-    def _collect_matching_files(self, dir_path: str, patterns: List[str]) -> None:
+    def _collect_ancestors(self) -> None:
         """
-        Recoge archivos que coinciden con los patrones de inclusión
-        
-        Args:
-            dir_path: Directorio a recorrer
-            patterns: Lista de patrones para comprobar
+        Registra todos los directorios ancestros de los items visibles
         """
-        try:
-            for root, dirs, files in os.walk(dir_path):
-                for file in files:
-                    full_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(full_path, self._base_path)
-                    norm_rel_path = normalize_path(rel_path)
-                    
-                    # Verificar si coincide con algún patrón
-                    for pattern in patterns:
-                        if matches_pattern(norm_rel_path, pattern):
-                            self._visible_items.add(norm_rel_path)
-                            break
-        except Exception:
-            # Ignorar errores de acceso a archivos/directorios
-            pass
+        dir_sep = os.sep  # normalize_path usa el separador del sistema
+        ancestors = self._visible_ancestors
+        
+        for item in self._visible_items:
+            parent_end = item.rfind(dir_sep)
+            while parent_end > 0:
+                parent = item[:parent_end]
+                # Si ya está registrado, también lo están sus propios ancestros
+                if parent in ancestors:
+                    break
+                ancestors.add(parent)
+                parent_end = item.rfind(dir_sep, 0, parent_end)
     
-    def _exclude_matching_files(self, dir_path: str, patterns: List[str]) -> None:
+    def _iter_files(
+        self, 
+        dir_path: str, 
+        exclude: Optional[Callable[[str], object]] = None
+    ) -> Iterator[str]:
         """
-        Excluye archivos que coinciden con los patrones de exclusión
+        Recorre un directorio nivel a nivel con os.scandir
+        
+        Los directorios de un mismo nivel se listan en paralelo en un pool de
+        hilos (scandir libera el GIL); las rutas se construyen y filtran en
+        el hilo que consume el generador.
         
         Args:
             dir_path: Directorio a recorrer
-            patterns: Lista de patrones para excluir
+            exclude: Función opcional que descarta un subdirectorio completo si
+                su ruta normalizada (con o sin separador final) coincide
+            
+        Yields:
+            str: Ruta normalizada de cada archivo, relativa a dir_path
         """
-        to_remove = set()
-        
-        for item in self._visible_items:
-            for pattern in patterns:
-                if matches_pattern(item, pattern):
-                    to_remove.add(item)
-                    break
+        dir_sep = os.sep  # normalize_path usa el separador del sistema
+        normcase = os.path.normcase
+        # Los nombres que devuelve scandir no tienen "." ni "..": basta normcase
+        # sobre cada nombre, sin pasar cada ruta por la caché de normalize_path
+        level = [(dir_path, "")]
+        with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+            while level:
+                # El nivel se reparte en un bloque de directorios por hilo: una tarea
+                # por directorio costaría más en coordinación que el propio listado
+                dirs = [abs_dir for abs_dir, _ in level]
+                if len(dirs) < SCAN_MIN_PARALLEL:
+                    listings = _scan_directories(dirs)
+                else:
+                    chunk = -(-len(dirs) // SCAN_WORKERS)
+                    blocks = executor.map(_scan_directories, (dirs[i:i + chunk] for i in range(0, len(dirs), chunk)))
+                    listings = [entries for block in blocks for entries in block]
+                
+                next_level = []
+                for (_, rel_dir), entries in zip(level, listings):
+                    prefix = rel_dir + dir_sep if rel_dir else ""
+                    for entry in entries:
+                        rel_path = prefix + normcase(entry.name)
+                        try:
+                            # DirEntry reutiliza el tipo leído del directorio, sin stat extra
+                            is_dir = entry.is_dir()
+                        except OSError:
+                            is_dir = False
+                        
+                        if is_dir:
+                            # Igual que os.walk: no descender por enlaces simbólicos
+                            if entry.is_symlink():
+                                continue
+                            if exclude is not None:
+                                if exclude(rel_path) or exclude(rel_path + dir_sep):
+                                    continue
+                            next_level.append((entry.path, rel_path))
+                        else:
+                            yield rel_path
+                level = next_level
+
+
+def _scan_directories(abs_dirs: List[str]) -> List[List[os.DirEntry]]:
+    """
+    Lista varios directorios para FilterEngine._iter_files
+    
+    Args:
+        abs_dirs: Directorios a listar
         
-        # Eliminar los items que coinciden con patrones de exclusión
-        self._visible_items -= to_remove
\ No newline at end of file
+    Returns:
+        Entradas de cada directorio, en el mismo orden; lista vacía para los
+        que no se pueden leer
+    """
+    listings = []
+    for abs_dir in abs_dirs:
+        try:
+            with os.scandir(abs_dir) as it:
+                listings.append(list(it))
+        except OSError:
+            # Ignorar errores de acceso a archivos/directorios
+            listings.append([])
+    return listings
@@ -1,5 +1,7 @@
 import locale
 import os
+import sys
+from types import MappingProxyType
 
 # Diccionarios de traducción
 TRANSLATIONS = {
@@ -65,24 +67,45 @@ TRANSLATIONS = {
     }
 }
 
+# Congelar las traducciones: diccionarios de solo lectura con claves internadas
+TRANSLATIONS = MappingProxyType({
+    language: MappingProxyType({sys.intern(key): text for key, text in texts.items()})
+    for language, texts in TRANSLATIONS.items()
+})
+
+# Idioma del sistema detectado (se calcula una sola vez)
+_SYSTEM_LANG = None
+
 def get_system_language():
     """
-    Detecta el idioma del sistema operativo.
+    Detecta el idioma del sistema operativo sin modificar el locale del proceso.
+    
+    Returns:
+        str: Código de idioma ('en' o 'es')
+    """
+    global _SYSTEM_LANG
+    if _SYSTEM_LANG is None:
+        _SYSTEM_LANG = _detect_system_language()
+    return _SYSTEM_LANG
+
+def _detect_system_language():
+    """
+    Consulta las variables de entorno de idioma en orden de precedencia y,
+    si no hay ninguna, el locale que Python ya configuró al arrancar.
     
     Returns:
         str: Código de idioma ('en' o 'es')
     """
     try:
-        # Método actualizado para evitar advertencias de deprecación
-        locale.setlocale(locale.LC_ALL, '')
+        for var in ('LC_ALL', 'LC_MESSAGES', 'LANG', 'LANGUAGE'):
+            env_lang = os.environ.get(var)
+            if env_lang:
+                return 'es' if env_lang.startswith('es') else 'en'
+        
+        # Alternativa para sistemas sin variables de entorno (p. ej. Windows)
         lang_code = locale.getlocale()[0]
         if lang_code and lang_code.startswith('es'):
             return 'es'
-            
-        # Alternativa para sistemas donde getlocale() podría no funcionar
-        env_lang = os.environ.get('LANG', '') or os.environ.get('LANGUAGE', '') or os.environ.get('LC_ALL', '')
-        if env_lang and env_lang.startswith('es'):
-            return 'es'
     except Exception:
         pass
     return 'en'
@@ -101,9 +124,46 @@ def translate(key, language, **kwargs):
     """
     try:
         text = TRANSLATIONS[language][key]
-        # Soporte para interpolación de variables
-        if kwargs and '{' in text:
-            return text.format(**kwargs)
+        # Soporte para interpolación de variables (format_map no copia kwargs)
+        if kwargs:
+            return text.format_map(kwargs)
         return text
     except KeyError:
-        return key
\ No newline at end of file
+        return key
+
+class Translator:
+    """
+    Traductor ligado a un idioma concreto.
+    Resuelve el diccionario del idioma una sola vez, al crearse.
+    """
+    
+    def __init__(self, language):
+        """
+        Inicializa el traductor para un idioma
+        
+        Args:
+            language (str): Código de idioma
+        """
+        self.language = language
+        self._texts = TRANSLATIONS.get(language, {})
+    
+    def __call__(self, key, **kwargs):
+        """
+        Traduce una clave al idioma del traductor.
+        
+        Args:
+            key (str): Clave de traducción
+            **kwargs: Variables para interpolar en la cadena traducida
+            
+        Returns:
+            str: Cadena traducida, o la propia clave si no existe
+        """
+        text = self._texts.get(key)
+        if text is None:
+            return key
+        if kwargs:
+            try:
+                return text.format_map(kwargs)
+            except KeyError:
+                return key
+        return text
@@ -1,20 +1,22 @@
 import os
+import shutil
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Set, Dict, List, Any, Optional
+from typing import Set, Dict, List, Any, Optional, Tuple
 
 from PyQt6.QtWidgets import (
     QMainWindow, QFileDialog, QTreeView, QVBoxLayout, QHBoxLayout, 
     QWidget, QPushButton, QLineEdit, QLabel, QMenu, QMessageBox,
     QGroupBox, QFormLayout, QStatusBar
 )
-from PyQt6.QtCore import Qt, pyqtSlot
+from PyQt6.QtCore import Qt, QTimer, pyqtSlot
 from PyQt6.QtGui import QStandardItemModel, QStandardItem, QAction
 
 from config_manager import ConfigManager
-from i18n import translate, get_system_language
+from i18n import Translator, get_system_language
 from filter_engine import FilterEngine
 from tree_manager import TreeManager
-from export_generator import generate_export_content
+from export_generator import export_fingerprint, generate_export_content
 
 class LLMExportApp(QMainWindow):
     """Aplicación para exportar archivos en formato amigable para LLMs."""
@@ -28,26 +30,37 @@ class LLMExportApp(QMainWindow):
         
         # Idioma actual (desde sistema operativo por defecto)
         self.current_language = get_system_language()
+        self.tr = Translator(self.current_language)
+        
+        # Acciones del menú de recientes, reutilizadas entre actualizaciones
+        self._recent_actions: Dict[str, QAction] = {}
+        
+        # Última exportación: (huella, archivo, (mtime_ns, tamaño) del archivo escrito)
+        self._last_export: Optional[Tuple[bytes, str, Optional[Tuple[int, int]]]] = None
         
         # Configurar interfaz
         self.setup_ui()
         
         # Inicializar tree manager con el modelo creado
-        self.tree_manager = TreeManager(self.tree_model)
+        self.tree_manager = TreeManager(self.tree_model, self.tree_view)
         self.tree_manager.set_visibility_function(self.filter_engine.is_visible)
         
+        # Guardado diferido: agrupa ráfagas de cambios en una sola escritura
+        self._save_timer = QTimer(self)
+        self._save_timer.setSingleShot(True)
+        self._save_timer.setInterval(500)
+        self._save_timer.timeout.connect(self.config_manager.flush)
+        self.config_manager.set_save_scheduler(self._save_timer.start)
+        
         # Cargar configuración guardada
         self.config_manager.load_config()
         self.current_language = self.config_manager.language
+        self.tr = Translator(self.current_language)
         
         # Actualizar interfaz con la configuración
         self.retranslate_ui()
         self.update_recent_menu()
     
-    def tr(self, key, **kwargs):
-        """Traduce una clave al idioma actual."""
-        return translate(key, self.current_language, **kwargs)
-    
     def setup_ui(self):
         """Configura los elementos de la interfaz de usuario."""
         # Configuración de la ventana principal
@@ -66,37 +79,45 @@ class LLMExportApp(QMainWindow):
         toolbar_layout = QHBoxLayout()
         
         # Grupo de filtros
-        filter_group = QGroupBox(self.tr('filter_section'))
-        filter_layout = QFormLayout(filter_group)
+        self.filter_group = QGroupBox(self.tr('filter_section'))
+        filter_layout = QFormLayout(self.filter_group)
+        
+        # Los filtros se aplican cuando se deja de escribir, no con cada tecla
+        self._filter_timer = QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(150)
+        self._filter_timer.timeout.connect(self.apply_filters)
         
         # Filtro de inclusión
         self.include_filter = QLineEdit()
         self.include_filter.setPlaceholderText(self.tr('include_filter_placeholder'))
-        self.include_filter.textChanged.connect(self.apply_filters)
-        filter_layout.addRow(self.tr('include_filter_label'), self.include_filter)
+        self.include_filter.textChanged.connect(self.schedule_filters)
+        self.include_label = QLabel(self.tr('include_filter_label'))
+        filter_layout.addRow(self.include_label, self.include_filter)
         
         # Filtro de exclusión
         self.exclude_filter = QLineEdit()
         self.exclude_filter.setPlaceholderText(self.tr('exclude_filter_placeholder'))
-        self.exclude_filter.textChanged.connect(self.apply_filters)
-        filter_layout.addRow(self.tr('exclude_filter_label'), self.exclude_filter)
+        self.exclude_filter.textChanged.connect(self.schedule_filters)
+        self.exclude_label = QLabel(self.tr('exclude_filter_label'))
+        filter_layout.addRow(self.exclude_label, self.exclude_filter)
         
-        toolbar_layout.addWidget(filter_group)
+        toolbar_layout.addWidget(self.filter_group)
         
         # Botones
         buttons_layout = QVBoxLayout()
         
-        open_button = QPushButton(self.tr('open_folder_button'))
-        open_button.clicked.connect(self.open_folder_dialog)
-        buttons_layout.addWidget(open_button)
+        self.open_button = QPushButton(self.tr('open_folder_button'))
+        self.open_button.clicked.connect(self.open_folder_dialog)
+        buttons_layout.addWidget(self.open_button)
         
-        reset_button = QPushButton(self.tr('reset_button'))
-        reset_button.clicked.connect(self.reset_selection)
-        buttons_layout.addWidget(reset_button)
+        self.reset_button = QPushButton(self.tr('reset_button'))
+        self.reset_button.clicked.connect(self.reset_selection)
+        buttons_layout.addWidget(self.reset_button)
         
-        export_button = QPushButton(self.tr('export_button'))
-        export_button.clicked.connect(self.export_selected)
-        buttons_layout.addWidget(export_button)
+        self.export_button = QPushButton(self.tr('export_button'))
+        self.export_button.clicked.connect(self.export_selected)
+        buttons_layout.addWidget(self.export_button)
         
         toolbar_layout.addLayout(buttons_layout)
         
@@ -109,9 +130,11 @@ class LLMExportApp(QMainWindow):
         self.tree_model.itemChanged.connect(self.handle_item_changed)
         
         self.tree_view.setModel(self.tree_model)
+        self.tree_view.expanded.connect(self.handle_item_expanded)
         self.tree_view.setAlternatingRowColors(True)
         self.tree_view.setAnimated(True)
         self.tree_view.setIndentation(20)
+        self.tree_view.setUniformRowHeights(True)  # Todas las filas son QStandardItem de texto
         self.tree_view.setSortingEnabled(True)
         
         main_layout.addWidget(self.tree_view)
@@ -123,85 +146,71 @@ class LLMExportApp(QMainWindow):
         self.status_bar.addWidget(self.status_label)
         
     def setup_menu(self):
-        """Configura el menú principal"""
+        """Configura el menú principal (una sola vez; retranslate_ui solo cambia los textos)"""
         menubar = self.menuBar()
         
         # Menú Archivo
-        file_menu = menubar.addMenu(self.tr('file_menu'))
+        self.file_menu = menubar.addMenu(self.tr('file_menu'))
         
-        open_action = QAction(self.tr('open_folder'), self)
-        open_action.triggered.connect(self.open_folder_dialog)
-        file_menu.addAction(open_action)
+        self.open_action = QAction(self.tr('open_folder'), self)
+        self.open_action.triggered.connect(self.open_folder_dialog)
+        self.file_menu.addAction(self.open_action)
         
         self.recent_menu = QMenu(self.tr('recent_folders'), self)
-        file_menu.addMenu(self.recent_menu)
+        self.recent_menu.triggered.connect(self.open_recent_folder)
+        self.file_menu.addMenu(self.recent_menu)
         
-        exit_action = QAction(self.tr('exit'), self)
-        exit_action.triggered.connect(self.close)
-        file_menu.addAction(exit_action)
+        self.exit_action = QAction(self.tr('exit'), self)
+        self.exit_action.triggered.connect(self.close)
+        self.file_menu.addAction(self.exit_action)
         
         # Menú Opciones
-        options_menu = menubar.addMenu(self.tr('options_menu'))
+        self.options_menu = menubar.addMenu(self.tr('options_menu'))
         
-        reset_action = QAction(self.tr('reset_selection'), self)
-        reset_action.triggered.connect(self.reset_selection)
-        options_menu.addAction(reset_action)
+        self.reset_action = QAction(self.tr('reset_selection'), self)
+        self.reset_action.triggered.connect(self.reset_selection)
+        self.options_menu.addAction(self.reset_action)
         
         # Menú de idioma
-        language_menu = menubar.addMenu(self.tr('language_menu'))
+        self.language_menu = menubar.addMenu(self.tr('language_menu'))
         
-        english_action = QAction(self.tr('english'), self)
-        english_action.triggered.connect(lambda: self.change_language('en'))
-        language_menu.addAction(english_action)
+        self.english_action = QAction(self.tr('english'), self)
+        self.english_action.triggered.connect(lambda: self.change_language('en'))
+        self.language_menu.addAction(self.english_action)
         
-        spanish_action = QAction(self.tr('spanish'), self)
-        spanish_action.triggered.connect(lambda: self.change_language('es'))
-        language_menu.addAction(spanish_action)
+        self.spanish_action = QAction(self.tr('spanish'), self)
+        self.spanish_action.triggered.connect(lambda: self.change_language('es'))
+        self.language_menu.addAction(self.spanish_action)
     
     def retranslate_ui(self):
         """Actualiza todos los textos de la interfaz al idioma actual."""
-        # Título de ventana
-        self.setWindowTitle(self.tr('app_title'))
-        
-        # Actualizar menús
-        menubar = self.menuBar()
-        menubar.clear()
-        
-        # Recrea los menús con textos traducidos
-        self.setup_menu()
-        self.update_recent_menu()
-        
-        # Actualizar elementos de la barra de herramientas
-        form_layout = self.centralWidget().layout().itemAt(0).layout().itemAt(0).widget().layout()
+        tr = self.tr
         
-        # Etiquetas de filtros
-        filter_group = self.centralWidget().layout().itemAt(0).layout().itemAt(0).widget()
-        filter_group.setTitle(self.tr('filter_section'))
+        # Título de ventana
+        self.setWindowTitle(tr('app_title'))
+        
+        # Menús: se conservan los objetos y solo se cambia su texto
+        self.file_menu.setTitle(tr('file_menu'))
+        self.open_action.setText(tr('open_folder'))
+        self.recent_menu.setTitle(tr('recent_folders'))
+        self.exit_action.setText(tr('exit'))
+        self.options_menu.setTitle(tr('options_menu'))
+        self.reset_action.setText(tr('reset_selection'))
+        self.language_menu.setTitle(tr('language_menu'))
+        self.english_action.setText(tr('english'))
+        self.spanish_action.setText(tr('spanish'))
+        
+        # Filtros
+        self.filter_group.setTitle(tr('filter_section'))
+        self.include_label.setText(tr('include_filter_label'))
+        self.include_filter.setPlaceholderText(tr('include_filter_placeholder'))
+        self.exclude_label.setText(tr('exclude_filter_label'))
+        self.exclude_filter.setPlaceholderText(tr('exclude_filter_placeholder'))
         
-        # Formulario de filtros (2 filas: include y exclude)
-        for row in range(2):
-            label_widget = form_layout.itemAt(row, QFormLayout.ItemRole.LabelRole).widget()
-            field_widget = form_layout.itemAt(row, QFormLayout.ItemRole.FieldRole).widget()
-            
-            if row == 0:  # Include filter
-                label_widget.setText(self.tr('include_filter_label'))
-                field_widget.setPlaceholderText(self.tr('include_filter_placeholder'))
-            elif row == 1:  # Exclude filter
-                label_widget.setText(self.tr('exclude_filter_label'))
-                field_widget.setPlaceholderText(self.tr('exclude_filter_placeholder'))
-        
-        # Actualizar botones
-        buttons_layout = self.centralWidget().layout().itemAt(0).layout().itemAt(1).layout()
-        buttons = [
-            (0, self.tr('open_folder_button')),
-            (1, self.tr('reset_button')),
-            (2, self.tr('export_button'))
-        ]
-        
-        for idx, text in buttons:
-            button = buttons_layout.itemAt(idx).widget()
-            if isinstance(button, QPushButton):
-                button.setText(text)
+        # Botones
+        self.open_button.setText(tr('open_folder_button'))
+        self.reset_button.setText(tr('reset_button'))
+        self.export_button.setText(tr('export_button'))
         
         # Actualizar estado
         self.update_status_bar()
@@ -210,17 +219,34 @@ class LLMExportApp(QMainWindow):
         """Cambia el idioma de la interfaz y guarda la preferencia."""
         if language in ('en', 'es') and language != self.current_language:
             self.current_language = language
+            self.tr = Translator(language)
             self.config_manager.set_language(language)
             self.retranslate_ui()
     
     def update_recent_menu(self):
         """Actualiza el menú de carpetas recientes."""
-        self.recent_menu.clear()
-        
+        # Reutilizar las acciones existentes y crear solo las de carpetas nuevas
+        actions: Dict[str, QAction] = {}
         for folder in self.config_manager.recent_folders:
-            action = QAction(folder, self)
-            action.triggered.connect(lambda checked=False, f=folder: self.open_folder(f))
-            self.recent_menu.addAction(action)
+            action = self._recent_actions.get(folder)
+            if action is None:
+                action = QAction(folder, self)
+                action.setData(folder)
+            actions[folder] = action
+        
+        # Liberar las acciones de carpetas que ya no están en la lista
+        for folder, action in self._recent_actions.items():
+            if folder not in actions:
+                action.deleteLater()
+        self._recent_actions = actions
+        
+        # Las acciones pertenecen a la ventana, clear() no las destruye
+        self.recent_menu.clear()
+        self.recent_menu.addActions(list(actions.values()))
+    
+    def open_recent_folder(self, action):
+        """Abre la carpeta asociada a una acción del menú de recientes."""
+        self.open_folder(action.data())
     
     def open_folder_dialog(self):
         """Muestra un diálogo para seleccionar una carpeta."""
@@ -244,8 +270,7 @@ class LLMExportApp(QMainWindow):
         self.setWindowTitle(f"{self.tr('app_title')} - {folder_path}")
         
         # Cargar selecciones anteriores
-        selected_paths = set(self.config_manager.get_selection(folder_path))
-        self.tree_manager.set_selected_paths(selected_paths)
+        self.tree_manager.set_selected_paths(self.config_manager.get_selection(folder_path))
         self.tree_manager.set_base_path(folder_path)
         
         # Cargar filtros de la carpeta
@@ -253,25 +278,30 @@ class LLMExportApp(QMainWindow):
         self.include_filter.setText(folder_filters.get("include_patterns", ""))
         self.exclude_filter.setText(folder_filters.get("exclude_patterns", ""))
         
-        # Configurar motor de filtros
-        self.filter_engine.set_base_path(folder_path)
-        self.filter_engine.set_include_patterns(self.include_filter.text())
-        self.filter_engine.set_exclude_patterns(self.exclude_filter.text())
+        # Configurar motor de filtros (un solo recorrido del disco)
+        self.filter_engine.configure(
+            folder_path,
+            self.include_filter.text(),
+            self.exclude_filter.text()
+        )
         
-        # Poblar árbol
+        # Poblar árbol; los filtros ya están aplicados, no hace falta el diferido
+        self._filter_timer.stop()
         self.tree_manager.populate_tree()
         
         # Actualizar menús
         self.update_recent_menu()
         
         # Expandir el nodo raíz
-        root = self.tree_model.invisibleRootItem()
-        if root.rowCount() > 0:
-            self.tree_view.expand(self.tree_model.indexFromItem(root.child(0)))
+        self._restore_expansion({""})
         
         # Actualizar barra de estado
         self.update_status_bar()
     
+    def schedule_filters(self):
+        """Programa la aplicación de filtros; cada cambio reinicia la espera."""
+        self._filter_timer.start()
+    
     def apply_filters(self):
         """Aplica los filtros y actualiza la visibilidad de los elementos."""
         # Obtener y guardar filtros actuales
@@ -288,12 +318,13 @@ class LLMExportApp(QMainWindow):
             exclude_patterns
         )
         
-        # Actualizar motor de filtros
-        self.filter_engine.set_include_patterns(include_patterns)
-        self.filter_engine.set_exclude_patterns(exclude_patterns)
+        # Actualizar motor de filtros; si los patrones no cambian no hay nada que hacer
+        if not self.filter_engine.set_patterns(include_patterns, exclude_patterns):
+            return
         
-        # Reconstruir el árbol para aplicar los nuevos filtros
-        self.tree_manager.populate_tree()
+        # Mostrar u ocultar las filas ya cargadas, sin reconstruir el árbol
+        with self._bulk_tree_update():
+            self.tree_manager.refresh_visibility()
         
         # Actualizar barra de estado
         self.update_status_bar()
@@ -310,33 +341,89 @@ class LLMExportApp(QMainWindow):
         
         # Simplemente mostramos un mensaje estático por ahora
         # En una implementación real, contaríamos los items
-        visible_count = len(self.tree_manager.get_selected_paths())
+        visible_count = self.tree_manager.selected_count()
         total_count = 100  # Placeholder
         
         self.status_label.setText(self.tr('showing_items', visible=visible_count, total=total_count))
     
+    @contextmanager
+    def _bulk_tree_update(self):
+        """
+        Agrupa cambios masivos en el árbol
+        
+        Solo se desconecta itemChanged, lo que evita la recursión: el resto de
+        señales del modelo siguen llegando a la vista (las filas que inserta
+        una carga diferida, los cambios de estado), que se repinta una sola
+        vez al terminar.
+        """
+        self.tree_view.setUpdatesEnabled(False)
+        self.tree_model.itemChanged.disconnect(self.handle_item_changed)
+        try:
+            yield
+        finally:
+            self.tree_model.itemChanged.connect(self.handle_item_changed)
+            self.tree_view.setUpdatesEnabled(True)
+    
     @pyqtSlot(QStandardItem)
     def handle_item_changed(self, item):
         """Maneja los cambios en los checkboxes de los elementos."""
         if item.isCheckable():
-            # Evitar recursión mientras procesamos
-            self.tree_model.itemChanged.disconnect(self.handle_item_changed)
-            
-            self.tree_manager.handle_item_changed(item)
-            
-            # Guardar selección actualizada
-            self.config_manager.save_selection(self.tree_manager.get_selected_paths())
+            with self._bulk_tree_update():
+                self.tree_manager.handle_item_changed(item)
             
-            # Reconectar la señal
-            self.tree_model.itemChanged.connect(self.handle_item_changed)
+            # La selección se modificó en su sitio (conjunto compartido): solo hay que guardarla
+            self.config_manager.save_selection()
             
             # Actualizar barra de estado
             self.update_status_bar()
     
+    def _restore_expansion(self, expand_paths: Set[str]) -> None:
+        """
+        Expande las carpetas indicadas con un único repintado de la vista
+        
+        Las carpetas se expanden de arriba abajo, de modo que cada expansión
+        carga los hijos de la carpeta antes de buscar los siguientes niveles.
+        
+        Args:
+            expand_paths: Rutas relativas de las carpetas a expandir ("" es la raíz)
+        """
+        if not expand_paths or self.tree_model.rowCount() == 0:
+            return
+        
+        # Incluir los ancestros: una carpeta solo se ve si lo están todos ellos
+        wanted = {""}
+        for path in expand_paths:
+            while path and path not in wanted:
+                wanted.add(path)
+                path = os.path.dirname(path)
+        
+        self.tree_view.setUpdatesEnabled(False)
+        try:
+            stack = [self.tree_model.item(0)]
+            while stack:
+                item = stack.pop()
+                if item.data(Qt.ItemDataRole.UserRole) not in wanted:
+                    continue
+                self.tree_view.expand(item.index())
+                for i in range(item.rowCount()):
+                    child = item.child(i)
+                    if child.hasChildren():
+                        stack.append(child)
+        finally:
+            self.tree_view.setUpdatesEnabled(True)
+    
+    def handle_item_expanded(self, index):
+        """Carga el contenido de una carpeta la primera vez que se expande."""
+        item = self.tree_model.itemFromIndex(index)
+        if item is not None:
+            self.tree_manager.fetch_children(item)
+    
     def reset_selection(self):
         """Reinicia todas las selecciones."""
-        self.tree_manager.reset_selection()
-        self.config_manager.save_selection(self.tree_manager.get_selected_paths())
+        # Solo se desmarcan los ítems; el árbol y sus carpetas abiertas se conservan
+        with self._bulk_tree_update():
+            self.tree_manager.reset_selection()
+        self.config_manager.save_selection()
         self.update_status_bar()
     
     def _generate_suggested_export_filename(self) -> str:
@@ -379,15 +466,18 @@ class LLMExportApp(QMainWindow):
         # Actualizar última ubicación
         self.config_manager.set_export_location(os.path.dirname(file_path))
         
-        # Generar y guardar contenido exportado
+        # Generar contenido exportado directamente en el archivo de destino
         try:
-            content = generate_export_content(
-                self.config_manager.current_folder, 
-                selected_paths
-            )
-            
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            fingerprint = export_fingerprint(self.config_manager.current_folder, selected_paths)
+            if not self._reuse_last_export(fingerprint, file_path):
+                # Búfer grande: la exportación encadena muchas escrituras pequeñas (encabezados)
+                with open(file_path, 'wb', buffering=1 << 20) as f:
+                    generate_export_content(
+                        self.config_manager.current_folder, 
+                        selected_paths,
+                        f
+                    )
+            self._last_export = (fingerprint, file_path, self._file_signature(file_path))
                 
             QMessageBox.information(
                 self, 
@@ -401,8 +491,50 @@ class LLMExportApp(QMainWindow):
                 f"{self.tr('export_error')} {e}"
             )
     
+    def _reuse_last_export(self, fingerprint: bytes, file_path: str) -> bool:
+        """
+        Reutiliza la exportación anterior si la selección y sus archivos no han cambiado
+        
+        Args:
+            fingerprint: Huella de la exportación pedida
+            file_path: Archivo de destino
+            
+        Returns:
+            bool: True si el destino ya tiene el contenido y no hay que generarlo
+        """
+        if self._last_export is None:
+            return False
+        last_fingerprint, last_path, last_signature = self._last_export
+        # El archivo anterior debe seguir tal como se escribió
+        if (last_fingerprint != fingerprint or last_signature is None
+                or self._file_signature(last_path) != last_signature):
+            return False
+        if not os.path.exists(file_path) or not os.path.samefile(last_path, file_path):
+            shutil.copyfile(last_path, file_path)
+        return True
+    
+    @staticmethod
+    def _file_signature(file_path: str) -> Optional[Tuple[int, int]]:
+        """Devuelve (mtime_ns, tamaño) de un archivo, o None si no existe"""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+    
     def closeEvent(self, event):
         """Maneja el evento de cierre de la ventana."""
-        # Guardar configuración
-        self.config_manager.save_config()
+        # Guardar filtros escritos que aún no se han aplicado
+        if self._filter_timer.isActive() and self.config_manager.current_folder:
+            self._filter_timer.stop()
+            self.config_manager.set_folder_filters(
+                self.config_manager.current_folder,
+                self.include_filter.text(),
+                self.exclude_filter.text()
+            )
+        
+        # Guardar cambios pendientes
+        self._save_timer.stop()
+        self.config_manager.flush()
+        self.tree_manager.shutdown()
         event.accept()
\ No newline at end of file
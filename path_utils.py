@@ -1,9 +1,21 @@
 import os
+import re
+import fnmatch
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator, Optional, Pattern, Tuple
 
+# fnmatch ignora mayúsculas/minúsculas en los sistemas donde normcase las unifica
+_CASE_INSENSITIVE = os.path.normcase("A") == "a"
+
+# Caracteres que convierten un patrón en glob; sin ellos es una ruta literal
+_GLOB_CHARS = frozenset("*?[")
+
+@lru_cache(maxsize=16384)
 def normalize_path(path):
     """
     Normaliza una ruta de archivo para asegurar consistencia en comparaciones.
-    Convierte todos los separadores a formato unificado.
+    Usa el separador del sistema, elimina componentes redundantes y, donde el
+    sistema de archivos no distingue mayúsculas (Windows), las unifica.
     
     Args:
         path (str): La ruta a normalizar
@@ -11,8 +23,7 @@ def normalize_path(path):
     Returns:
         str: Ruta normalizada
     """
-    # Normalizar a backslash (estilo Windows) para consistencia
-    return path.replace('/', '\\')
+    return os.path.normcase(os.path.normpath(path))
 
 def get_relative_path(base_path, full_path):
     """
@@ -45,11 +56,54 @@ def is_subpath(parent, child):
     parent = os.path.normpath(parent)
     child = os.path.normpath(child)
     
-    # Verificar si child comienza con parent y hay un separador después
-    return child.startswith(parent) and (
-        len(child) == len(parent) or
-        child[len(parent)] == os.path.sep
-    )
+    # Verificar si child es parent o comienza con parent seguido de un separador
+    return child == parent or is_subpath_fast(parent + os.path.sep, child)
+
+def is_subpath_fast(parent_with_sep, child):
+    """
+    Variante de is_subpath para bucles: no normaliza ninguna ruta.
+    
+    Args:
+        parent_with_sep (str): Ruta padre ya normalizada y terminada en os.sep,
+            calculada una sola vez fuera del bucle
+        child (str): Ruta ya normalizada a verificar
+        
+    Returns:
+        bool: True si child está dentro de la carpeta padre
+    """
+    return child.startswith(parent_with_sep)
+
+def walk_fast(root, descend: Optional[Callable[[os.DirEntry], bool]] = None) -> Iterator[os.DirEntry]:
+    """
+    Recorre un directorio con os.scandir y una pila explícita.
+    Cada DirEntry conserva el tipo leído del directorio, así que consultar
+    is_dir no añade un stat por entrada. Como os.walk, no desciende por
+    enlaces simbólicos a directorios e ignora los que no puede leer.
+    
+    Args:
+        root: Directorio a recorrer
+        descend: Función opcional que decide si se entra en un subdirectorio;
+            si devuelve False se omite todo su contenido (la propia entrada
+            sí se produce)
+        
+    Yields:
+        os.DirEntry: Cada entrada (archivo o directorio) bajo root
+    """
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        
+        for entry in entries:
+            yield entry
+            try:
+                if entry.is_dir(follow_symlinks=False) and (descend is None or descend(entry)):
+                    stack.append(entry.path)
+            except OSError:
+                pass
 
 def matches_pattern(path, pattern):
     """
@@ -78,4 +132,124 @@ def matches_pattern(path, pattern):
             return norm_path.startswith(parts[0]) and norm_path.endswith(parts[1])
     
     # Para patrones simples usar fnmatch
-    return fnmatch.fnmatch(norm_path, norm_pattern)
\ No newline at end of file
+    return fnmatch.fnmatch(norm_path, norm_pattern)
+
+def _pattern_to_regex(pattern):
+    """
+    Traduce un patrón glob ya normalizado a una expresión regular equivalente
+    a matches_pattern.
+    
+    Args:
+        pattern (str): Patrón glob normalizado
+        
+    Returns:
+        str: Expresión regular para usar con re.match
+    """
+    # Caso especial de un solo **: la ruta empieza y termina como el patrón
+    if "**" in pattern:
+        parts = pattern.split("**")
+        if len(parts) == 2:
+            return f"(?s:(?={re.escape(parts[0])}).*{re.escape(parts[1])}\\Z)"
+    
+    # fnmatch ignora mayúsculas/minúsculas en Windows
+    regex = fnmatch.translate(pattern)
+    if _CASE_INSENSITIVE:
+        regex = f"(?i:{regex})"
+    return regex
+
+def compile_patterns(patterns: Iterable[str]) -> Optional[Pattern[str]]:
+    """
+    Compila una lista de patrones glob en una única expresión regular.
+    
+    Args:
+        patterns: Patrones glob ya normalizados con normalize_path
+        
+    Returns:
+        Expresión compilada que coincide si coincide cualquier patrón,
+        o None si la lista está vacía
+    """
+    regexes = [_pattern_to_regex(p) for p in patterns]
+    if not regexes:
+        return None
+    return re.compile("|".join(f"(?:{r})" for r in regexes))
+
+@lru_cache(maxsize=256)
+def compile_pattern(pattern: str) -> Pattern[str]:
+    """
+    Compila un patrón glob con la misma semántica que matches_pattern.
+    
+    Args:
+        pattern (str): El patrón glob, sin normalizar
+        
+    Returns:
+        Expresión compilada para usar con match sobre rutas normalizadas
+    """
+    return re.compile(_pattern_to_regex(normalize_path(pattern)))
+
+
+class PatternMatcher:
+    """
+    Comprueba rutas contra una lista de patrones glob.
+    Los patrones sin comodines se comparan por igualdad en un conjunto y
+    los de la forma "*sufijo" con str.endswith; el resto se agrupa en una
+    única expresión regular.
+    """
+    
+    def __init__(self, patterns: Iterable[str]):
+        """
+        Inicializa el comprobador
+        
+        Args:
+            patterns: Patrones glob ya normalizados con normalize_path
+        """
+        literals = set()
+        suffixes = []
+        globs = []
+        for pattern in patterns:
+            key = pattern.lower() if _CASE_INSENSITIVE else pattern
+            if _GLOB_CHARS.isdisjoint(pattern):
+                literals.add(key)
+            elif pattern.startswith("*") and _GLOB_CHARS.isdisjoint(pattern[1:]):
+                # "*" coincide con cualquier cadena, también con separadores
+                suffixes.append(key[1:])
+            else:
+                globs.append(pattern)
+        
+        self._literals = frozenset(literals)
+        self._suffixes = tuple(suffixes)
+        self._glob_re = compile_patterns(globs)
+    
+    def __bool__(self) -> bool:
+        return bool(self._literals or self._suffixes) or self._glob_re is not None
+    
+    def match(self, path: str) -> bool:
+        """
+        Verifica si una ruta normalizada coincide con algún patrón
+        
+        Args:
+            path: Ruta normalizada con normalize_path
+            
+        Returns:
+            bool: True si coincide con algún patrón
+        """
+        if self._literals or self._suffixes:
+            key = path.lower() if _CASE_INSENSITIVE else path
+            # endswith acepta una tupla y prueba todos los sufijos en C
+            if key in self._literals or key.endswith(self._suffixes):
+                return True
+        return self._glob_re is not None and self._glob_re.match(path) is not None
+
+
+@lru_cache(maxsize=256)
+def get_pattern_matcher(patterns: Tuple[str, ...]) -> Optional[PatternMatcher]:
+    """
+    Obtiene el comprobador de una lista de patrones, compilándolo solo la
+    primera vez que aparece (p. ej. al volver a escribir un filtro ya usado)
+    
+    Args:
+        patterns: Patrones glob ya normalizados con normalize_path
+        
+    Returns:
+        Comprobador de los patrones, o None si la lista está vacía
+    """
+    return PatternMatcher(patterns) if patterns else None
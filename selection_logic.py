@@ -1,6 +1,6 @@
 from typing import Dict, Set, List, Callable, Any, Tuple, Optional
 import os
-from path_utils import normalize_path, is_subpath, matches_pattern
+from path_utils import normalize_path, is_subpath, matches_pattern, compile_pattern
 
 # Tipo para representar el estado de un item
 # PathState = Dict[str, bool]  # {"selected": bool, "partial": bool}
@@ -50,10 +50,28 @@ def set_item_state(
     """
     # Crear una copia para mantener inmutabilidad
     new_state = state.copy()
-    norm_path = normalize_path(path)
-    new_state[norm_path] = {"selected": selected, "partial": partial}
+    _write_item_state(new_state, path, selected, partial)
     return new_state
 
+def _write_item_state(
+    state: Dict[str, Dict[str, bool]], 
+    path: str, 
+    selected: bool, 
+    partial: bool = False
+) -> None:
+    """
+    Variante de set_item_state que modifica el estado recibido, para los
+    bucles de propagación: copiar el diccionario en cada cambio los hacía
+    cuadráticos
+    
+    Args:
+        state: Estado de selección, que se modifica
+        path: Ruta del item
+        selected: Si está seleccionado
+        partial: Si está parcialmente seleccionado
+    """
+    state[normalize_path(path)] = {"selected": selected, "partial": partial}
+
 def is_selected(state: Dict[str, Dict[str, bool]], path: str) -> bool:
     """
     Comprueba si un item está seleccionado
@@ -114,6 +132,7 @@ def get_selected_paths(state: Dict[str, Dict[str, bool]]) -> Set[str]:
     }
 
 # Comportamientos de selección (funciones de orden superior)
+# "transform" recibe (seleccionado: bool, ruta) y devuelve el nuevo valor booleano
 
 def standard_behavior() -> Dict[str, Callable]:
     """
@@ -160,7 +179,7 @@ def pattern_selection_behavior(pattern_matches_fn: Callable[[str], bool]) -> Dic
     """
     return {
         "propagate_down": lambda _state, _path: True,
-        "transform": lambda _current_state, path: pattern_matches_fn(path)
+        "transform": lambda _selected, path: pattern_matches_fn(path)
     }
 
 def inverse_selection_behavior() -> Dict[str, Callable]:
@@ -172,7 +191,7 @@ def inverse_selection_behavior() -> Dict[str, Callable]:
     """
     return {
         "propagate_down": lambda _state, _path: True,
-        "transform": lambda current_state, _path: not current_state["selected"]
+        "transform": lambda selected, _path: not selected
     }
 
 # Funciones principales de selección
@@ -197,60 +216,84 @@ def toggle_selection(
     Returns:
         Nuevo estado con la selección actualizada
     """
-    # Obtenemos el estado actual y lo invertimos
-    item_state = get_item_state(state, path)
-    new_selected = not item_state["selected"]
-    
-    # Aplicar transformación personalizada si existe
-    if "transform" in behavior:
-        new_selected = behavior["transform"](item_state, path)
-    
-    # Comenzamos con un nuevo estado actualizado para este item
-    new_state = set_item_state(state, path, new_selected)
-    
-    # Propagar hacia abajo si el comportamiento lo indica
-    if new_selected and behavior.get("propagate_down", lambda _s, _p: True)(state, path):
-        for child in children:
-            # Verificar si debemos propagar a este hijo según la visibilidad
-            should_propagate = True
-            if is_visible_fn:
-                should_propagate = is_visible_fn(child)
-            
-            if should_propagate:
-                child_children = []  # Aquí se debería pasar la lista real de hijos
-                new_state = toggle_selection(
-                    new_state, 
-                    child, 
-                    child_children, 
-                    behavior,
-                    is_visible_fn
-                )
-    
-    # Propagar hacia arriba (actualizar estado del padre)
-    parent = get_parent_path(path)
-    if parent:
-        # Si tenemos función de visibilidad, filtrar hijos no visibles
-        siblings = []  # Aquí se debería pasar la lista real de hermanos
+    # Una sola copia al principio; la propagación escribe sobre ella
+    state = state.copy()
+    propagate_down = behavior.get("propagate_down", lambda _s, _p: True)
+    transform = behavior.get("transform")
+    
+    # Recorrido con pila explícita en lugar de recursión; se anotan los padres
+    # de los items visitados para recalcularlos una sola vez al final
+    parents: List[str] = []
+    seen_parents: Set[str] = set()
+    stack = [(path, children)]
+    while stack:
+        current, current_children = stack.pop()
         
-        # Obtener estados de los hermanos
-        sibling_states = [get_item_state(new_state, s)["selected"] for s in siblings]
-        sibling_visibility = [True] * len(siblings)
-        if is_visible_fn:
-            sibling_visibility = [is_visible_fn(s) for s in siblings]
+        # Obtenemos el estado actual y lo invertimos
+        item_state = get_item_state(state, current)
+        new_selected = not item_state["selected"]
         
-        # Calcular nuevo estado del padre según el comportamiento
-        all_selected = behavior.get("recalculate_up", lambda s: all(s))(sibling_states)
-        any_selected = any(s and v for s, v in zip(sibling_states, sibling_visibility))
+        # Aplicar transformación personalizada si existe
+        if transform is not None:
+            new_selected = transform(item_state["selected"], current)
         
-        # Actualizar estado del padre
-        if all_selected:
-            new_state = set_item_state(new_state, parent, True, False)
-        elif any_selected:
-            new_state = set_item_state(new_state, parent, True, True)
-        else:
-            new_state = set_item_state(new_state, parent, False, False)
+        _write_item_state(state, current, new_selected)
+        
+        parent = get_parent_path(current)
+        if parent and parent not in seen_parents:
+            seen_parents.add(parent)
+            parents.append(parent)
+        
+        # Propagar hacia abajo si el comportamiento lo indica
+        if new_selected and propagate_down(state, current):
+            # En orden inverso para visitar los hijos en su orden original
+            for child in reversed(current_children):
+                # Verificar si debemos propagar a este hijo según la visibilidad
+                if is_visible_fn is None or is_visible_fn(child):
+                    child_children = []  # Aquí se debería pasar la lista real de hijos
+                    stack.append((child, child_children))
+    
+    # Propagar hacia arriba: los padres más profundos primero
+    for parent in reversed(parents):
+        _recalculate_parent(state, parent, behavior, is_visible_fn)
+    
+    return state
+
+def _recalculate_parent(
+    state: Dict[str, Dict[str, bool]], 
+    parent: str, 
+    behavior: Dict[str, Callable],
+    is_visible_fn: Optional[Callable[[str], bool]] = None
+) -> None:
+    """
+    Actualiza el estado de un padre a partir del de sus hijos
     
-    return new_state
+    Args:
+        state: Estado de selección, que se modifica
+        parent: Ruta del padre
+        behavior: Comportamiento de selección a aplicar
+        is_visible_fn: Función opcional para determinar visibilidad
+    """
+    # Si tenemos función de visibilidad, filtrar hijos no visibles
+    siblings = []  # Aquí se debería pasar la lista real de hermanos
+    
+    # Obtener estados de los hermanos
+    sibling_states = [get_item_state(state, s)["selected"] for s in siblings]
+    sibling_visibility = [True] * len(siblings)
+    if is_visible_fn:
+        sibling_visibility = [is_visible_fn(s) for s in siblings]
+    
+    # Calcular nuevo estado del padre según el comportamiento
+    all_selected = behavior.get("recalculate_up", lambda s: all(s))(sibling_states)
+    any_selected = any(s and v for s, v in zip(sibling_states, sibling_visibility))
+    
+    # Actualizar estado del padre
+    if all_selected:
+        _write_item_state(state, parent, True, False)
+    elif any_selected:
+        _write_item_state(state, parent, True, True)
+    else:
+        _write_item_state(state, parent, False, False)
 
 def apply_pattern_selection(
     state: Dict[str, Dict[str, bool]], 
@@ -271,18 +314,12 @@ def apply_pattern_selection(
     # Crear un nuevo estado vacío
     new_state = create_empty_state()
     
-    # Función que comprueba si una ruta coincide con el patrón
-    def matches(p: str) -> bool:
-        return matches_pattern(p, pattern)
-    
-    # Crear comportamiento de selección por patrón
-    behavior = pattern_selection_behavior(matches)
-    
-    # Aplicar a todas las rutas
+    # El patrón se compila una sola vez y cada ruta se normaliza una vez;
+    # el estado nuevo se rellena directamente, sin copiarlo en cada ruta
+    match = compile_pattern(pattern).match
     for path in all_paths:
-        item_state = get_item_state(state, path)
-        should_select = behavior["transform"](item_state, path)
-        new_state = set_item_state(new_state, path, should_select)
+        norm_path = normalize_path(path)
+        new_state[norm_path] = {"selected": match(norm_path) is not None, "partial": False}
     
     return new_state
 
@@ -309,14 +346,16 @@ def combine_behaviors(*behaviors):
             combined["recalculate_up"] = b["recalculate_up"]
             break
     
-    # Combinar transform (aplicar transformaciones en secuencia)
+    # Combinar transform (aplicar transformaciones en secuencia); cada una
+    # recibe el booleano de la anterior, sin crear diccionarios intermedios
     transform_fns = [b.get("transform") for b in behaviors if "transform" in b]
-    if transform_fns:
-        def combined_transform(current_state, path):
-            result = current_state["selected"]
+    if len(transform_fns) == 1:
+        combined["transform"] = transform_fns[0]
+    elif transform_fns:
+        def combined_transform(selected, path):
             for fn in transform_fns:
-                result = fn({"selected": result}, path)
-            return result
+                selected = fn(selected, path)
+            return selected
         combined["transform"] = combined_transform
     
     return combined
\ No newline at end of file
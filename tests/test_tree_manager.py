@@ -0,0 +1,78 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt6.QtGui import QStandardItemModel
+from PyQt6.QtWidgets import QApplication, QTreeView
+
+from filter_engine import FilterEngine
+from tree_manager import TreeManager
+
+_app = QApplication.instance() or QApplication([])
+
+
+class FilteredRowsTest(unittest.TestCase):
+    """Las filas que ocultan los filtros siguen ocultas tras reconstruir el árbol."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        for rel_path in ("a.py", os.path.join("docs", "r.md"), os.path.join("src", "c.py")):
+            full_path = os.path.join(self.folder, rel_path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, "w") as f:
+                f.write("x")
+
+        self.model = QStandardItemModel()
+        self.view = QTreeView()
+        self.view.setModel(self.model)
+        self.filter_engine = FilterEngine()
+        self.tree_manager = TreeManager(self.model, self.view)
+        self.tree_manager.set_visibility_function(self.filter_engine.is_visible)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def open_folder(self, include_patterns):
+        # Mismos pasos que LLMExportApp.open_folder
+        self.tree_manager.set_selected_paths(set())
+        self.tree_manager.set_base_path(self.folder)
+        self.filter_engine.configure(self.folder, include_patterns, "")
+        self.tree_manager.populate_tree()
+
+    def hidden_rows(self):
+        base = self.model.item(0)
+        return {
+            base.child(row).text(): self.view.isRowHidden(row, base.index())
+            for row in range(base.rowCount())
+        }
+
+    def test_filtered_row_hidden_after_open_folder(self):
+        self.open_folder("*.py")
+        self.assertEqual(self.hidden_rows(), {"[docs]": True, "[src]": False, "a.py": False})
+
+        # Reabrir con el filtro guardado reconstruye el modelo
+        self.open_folder("*.py")
+        self.assertEqual(self.hidden_rows(), {"[docs]": True, "[src]": False, "a.py": False})
+
+    def test_filtered_row_hidden_after_fetch_children(self):
+        os.makedirs(os.path.join(self.folder, "src", "notes"))
+        with open(os.path.join(self.folder, "src", "notes", "n.md"), "w") as f:
+            f.write("x")
+        self.open_folder("*.py")
+
+        src_item = self.model.item(0).child(1)
+        self.tree_manager.fetch_children(src_item)
+        hidden = {
+            src_item.child(row).text(): self.view.isRowHidden(row, src_item.index())
+            for row in range(src_item.rowCount())
+        }
+        self.assertEqual(hidden, {"[notes]": True, "c.py": False})
+
+
+if __name__ == "__main__":
+    unittest.main()
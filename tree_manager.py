@@ -1,18 +1,46 @@
 from __future__ import annotations
 
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Callable, Optional, Set
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import QSignalBlocker, Qt
 from PyQt6.QtGui import QStandardItem, QStandardItemModel
+from PyQt6.QtWidgets import QTreeView
 
-from path_utils import normalize_path # Asumiendo que path_utils.py existe y es relevante
+from filter_engine import SCAN_WORKERS
+from path_utils import walk_fast
 
 __all__ = ["TreeManager"]
 
-# Rol personalizado para almacenar si un ítem es un directorio
-IS_DIRECTORY_ROLE = Qt.ItemDataRole.UserRole + 1
+# Rol de datos en el que cada ítem expone su ruta relativa al resto de la aplicación
+_USER_ROLE = Qt.ItemDataRole.UserRole
+
+# Subcarpetas a partir de las cuales se buscan las cadenas de carpetas en paralelo.
+# Cada comprobación lee como mucho dos entradas: con menos carpetas, repartirlas
+# entre hilos cuesta más que hacerlas seguidas
+COMPACT_MIN_PARALLEL = 512
+
+# Comprobaciones mínimas por tarea enviada a los hilos
+COMPACT_BLOCK_SIZE = 128
+
+class TreeItem(QStandardItem):
+    """Ítem del árbol que guarda si es una carpeta y su ruta relativa como atributos de Python.
+
+    Consultar los atributos no cruza a C++ ni convierte un QVariant, como sí
+    ocurre con un rol de datos. La ruta también se guarda en UserRole para
+    quien solo tenga acceso al modelo.
+    """
+
+    __slots__ = ("is_dir", "rel_path")
+
+    def __init__(self, text: str, is_dir: bool, rel_path: str) -> None:
+        super().__init__(text)
+        self.is_dir = is_dir
+        self.rel_path = rel_path
+        self.setData(rel_path, _USER_ROLE)
 
 class TreeManager:
     """Administra el árbol de archivos y la lógica de selección, guardando solo archivos seleccionados."""
@@ -20,11 +48,24 @@ class TreeManager:
     # ---------------------------------------------------------------------
     # INITIALISATION
     # ---------------------------------------------------------------------
-    def __init__(self, tree_model: QStandardItemModel) -> None:
+    def __init__(self, tree_model: QStandardItemModel, tree_view: QTreeView | None = None) -> None:
         self._model: QStandardItemModel = tree_model
+        # La raíz invisible pertenece al modelo durante toda su vida
+        self._root: QStandardItem = tree_model.invisibleRootItem()
+        # Con vista, los ítems filtrados se cargan ocultos y los filtros solo cambian
+        # su visibilidad; sin ella se omiten y hay que repoblar el árbol
+        self._view: QTreeView | None = tree_view
         self._base_path: Path | None = None
         self._selected_paths: Set[str] = set()  # Solo almacena rutas relativas de ARCHIVOS
         self._is_visible: Optional[Callable[[str], bool]] = None
+        # Carpetas cuyos hijos ya están en el modelo, con esos hijos como
+        # (ruta relativa, ítem): los recorridos no pasan por child() ni data()
+        self._children: Dict[str, List[Tuple[str, TreeItem]]] = {}
+        self._selected_dirs: Set[str] = set()  # Carpetas que contienen algún archivo seleccionado
+        self._hidden_paths: Set[str] = set()  # Ítems cargados que los filtros ocultan
+        self._descendants_cache: Dict[str, bool] = {}  # ¿Contiene la carpeta algo visible?
+        self._selections_pruned = False  # La selección ya se depuró para la siguiente población
+        self._executor: ThreadPoolExecutor | None = None  # Hilos para carpetas muy grandes; se crean al usarlos
 
     # ------------------------------------------------------------------
     # PUBLIC CONFIGURATION API
@@ -32,15 +73,27 @@ class TreeManager:
     def set_visibility_function(self, fn: Callable[[str], bool]) -> None:
         """Registra la función que decide si un nodo es visible."""
         self._is_visible = fn
+        self._descendants_cache = {}
 
     def set_base_path(self, path: str | os.PathLike[str]) -> None:
         """Define la carpeta raíz y purga selecciones inexistentes."""
         self._base_path = Path(path).resolve()
         self._prune_nonexistent_selections() 
+        self._selections_pruned = True
 
     def set_selected_paths(self, paths: Set[str]) -> None:
-        """Carga la selección previamente almacenada (rutas de archivos)."""
-        self._selected_paths = set(paths)
+        """Adopta el conjunto de la selección almacenada (rutas de archivos).
+
+        El conjunto no se copia: los cambios de selección lo modifican en su
+        sitio, y quien lo guarda (ConfigManager) los ve sin copias.
+        """
+        # Rutas internadas, como las de los ítems: al buscarlas en el conjunto
+        # la comparación de cadenas se resuelve por identidad
+        interned = [sys.intern(p) for p in paths]
+        paths.clear()
+        paths.update(interned)
+        self._selected_paths = paths
+        self._selections_pruned = False
 
     # ------------------------------------------------------------------
     # PUBLIC QUERIES
@@ -49,119 +102,295 @@ class TreeManager:
         """Devuelve las rutas de ARCHIVOS actualmente seleccionadas (relativas)."""
         return set(self._selected_paths)
 
+    def selected_count(self) -> int:
+        """Número de archivos seleccionados, sin copiar la selección."""
+        return len(self._selected_paths)
+
     # ------------------------------------------------------------------
     # TREE BUILDING
     # ------------------------------------------------------------------
     def populate_tree(self) -> None:
         """Reconstruye el modelo en memoria a partir del disco."""
-        self._model.blockSignals(True) 
-        self._model.clear()
+        # La reconstrucción se anuncia como un único reinicio del modelo: la vista
+        # se actualiza una vez al final en lugar de fila a fila. Dentro, las señales
+        # se bloquean (itemChanged incluida); QSignalBlocker restaura el estado
+        # previo, así que esto puede ejecutarse dentro de una actualización masiva.
+        # La vista tampoco se repinta hasta terminar (si ya lo estaba, se respeta)
+        repaint_view = self._view is not None and self._view.updatesEnabled()
+        if repaint_view:
+            self._view.setUpdatesEnabled(False)
+        built: List[Tuple[QStandardItem, List[Tuple[str, TreeItem]]]] = []
+        self._model.beginResetModel()
+        blocker = QSignalBlocker(self._model)
+        try:
+            built = self._build_model()
+        finally:
+            blocker.unblock()
+            self._model.endResetModel()
+            # El reinicio de la vista olvida las filas ocultas: se ocultan después
+            self._hide_filtered_rows(built)
+            if repaint_view:
+                self._view.setUpdatesEnabled(True)
+
+    def _build_model(self) -> List[Tuple[QStandardItem, List[Tuple[str, TreeItem]]]]:
+        """Vacía el modelo y crea la carpeta base con su contenido inicial.
+
+        Devuelve las carpetas cargadas con sus filas, para _hide_filtered_rows.
+        """
+        # removeRows en lugar de clear, que abriría otro reinicio anidado
+        self._model.removeRows(0, self._model.rowCount())
         self._model.setHorizontalHeaderLabels(["Nombre"])
 
         if self._base_path is None:
-            self._model.blockSignals(False)
-            return
-
-        self._prune_nonexistent_selections() 
+            return []
+
+        # Tras set_base_path la selección ya está depurada: no repetir un stat por archivo
+        if not self._selections_pruned:
+            self._prune_nonexistent_selections()
+        self._selections_pruned = False
+
+        # Las carpetas con archivos seleccionados se cargan al inicio para
+        # mostrar su estado; el resto se carga al expandirlas
+        self._children = {}
+        self._hidden_paths = set()
+        self._descendants_cache = {}
+        self._selected_dirs = set()
+        for rel_file_path in self._selected_paths:
+            parent = os.path.dirname(rel_file_path)
+            while parent and parent not in self._selected_dirs:
+                self._selected_dirs.add(parent)
+                parent = os.path.dirname(parent)
 
-        root_item = self._model.invisibleRootItem()
-        
         base_folder_display_name = f"[{self._base_path.name}]"
-        base_folder_item = QStandardItem(base_folder_display_name)
-        base_folder_item.setData("", Qt.ItemDataRole.UserRole) 
-        base_folder_item.setData(True, IS_DIRECTORY_ROLE) 
+        base_folder_item = TreeItem(base_folder_display_name, True, "")
         base_folder_item.setCheckable(True)
-        root_item.appendRow(base_folder_item)
+        self._root.appendRow(base_folder_item)
 
-        self._add_directory_items(base_folder_item, self._base_path, rel_path_context="")
+        built = self._add_directory_items(base_folder_item, self._base_path, rel_path_context="")
         
+        # Las subcarpetas ya tienen su estado; la carpeta base es la raíz, no tiene ancestros
         self._calculate_and_set_folder_state_from_children(base_folder_item)
-        self._update_ancestor_states_after_population(base_folder_item) 
+        return built
+
+    def fetch_children(self, item: QStandardItem) -> None:
+        """Carga los hijos de una carpeta que todavía no se ha expandido."""
+        # Los marcadores de carga diferida son QStandardItem sin is_dir
+        if self._base_path is None or not getattr(item, "is_dir", False):
+            return
+
+        rel_path = item.rel_path
+        if rel_path in self._children:
+            return
 
-        self._model.blockSignals(False)
+        # Quitar el marcador y añadir el contenido real de la carpeta
+        item.removeRows(0, item.rowCount())
+        built = self._add_directory_items(item, self._base_path / rel_path, rel_path_context=rel_path)
+        self._hide_filtered_rows(built)
 
 
     def _add_directory_items(
         self,
         parent_ui_item: QStandardItem,
-        abs_dir_path: Path,
+        abs_dir_path: str | os.PathLike[str],
         *,
         rel_path_context: str,
-    ) -> None:
-        """Añade recursivamente ítems de directorio y archivo al parent_ui_item, ordenados y con formato."""
-        try:
-            all_names_in_dir = os.listdir(abs_dir_path)
-        except PermissionError:
-            return 
+    ) -> List[Tuple[QStandardItem, List[Tuple[str, TreeItem]]]]:
+        """Añade los ítems de directorio y archivo al parent_ui_item, ordenados y con formato.
+
+        Solo se desciende en las subcarpetas que contienen archivos seleccionados;
+        las demás reciben un hijo marcador y se cargan con fetch_children.
+        El recorrido usa una pila explícita, sin recursión. Devuelve las carpetas
+        cargadas con sus filas; las filtradas quedan por ocultar (_hide_filtered_rows).
+        """
+        # Primera pasada (preorden): crear las filas de cada carpeta
+        built = []
+        stack = [(parent_ui_item, abs_dir_path, rel_path_context)]
+        while stack:
+            dir_item, dir_abs_path, dir_rel_path = stack.pop()
+            built.append((dir_item, self._build_directory_rows(dir_abs_path, dir_rel_path, stack)))
+
+        # Segunda pasada (de las carpetas más profundas hacia arriba): insertar las
+        # filas y calcular el estado. Cada subcarpeta queda completa antes de
+        # enlazarse a su padre, así no se emite itemChanged durante la carga.
+        for dir_item, rows in reversed(built):
+            if rows:
+                dir_item.appendRows([ui_item for _, ui_item in rows])
+            if dir_item is not parent_ui_item:
+                self._calculate_and_set_folder_state_from_children(dir_item)
+
+        return built
+
+    def _hide_filtered_rows(self, built: List[Tuple[QStandardItem, List[Tuple[str, TreeItem]]]]) -> None:
+        """Oculta en la vista las filas filtradas de las carpetas recién cargadas.
+
+        Debe llamarse fuera de un reinicio del modelo: al terminarlo, la vista
+        vuelve a mostrar todas las filas.
+        """
+        if self._view is not None and self._hidden_paths:
+            for dir_item, rows in built:
+                parent_index = None
+                for row, (rel_path, _) in enumerate(rows):
+                    if rel_path in self._hidden_paths:
+                        if parent_index is None:
+                            parent_index = dir_item.index()
+                        self._view.setRowHidden(row, parent_index, True)
+
+    def refresh_visibility(self) -> None:
+        """Aplica los filtros actuales a los ítems ya cargados, sin reconstruir el modelo."""
+        if self._view is None or self._base_path is None or self._model.rowCount() == 0:
+            self.populate_tree()
+            return
+
+        # Los filtros han cambiado: lo calculado con los anteriores ya no vale
+        self._descendants_cache = {}
+
+        # Recorrer las carpetas cargadas mostrando u ocultando cada fila; las rutas
+        # absolutas se forman concatenando, sin un Path por ítem
+        base_prefix = os.path.join(self._base_path, "")
+        hidden: Set[str] = set()
+        loaded_folders = []
+        # Una carpeta descartada no contiene nada visible: sus descendientes cargados
+        # se ocultan sin consultar el filtro para cada uno
+        stack = [("", self._model.item(0), True)]
+        while stack:
+            dir_rel_path, dir_item, dir_visible = stack.pop()
+            loaded_folders.append(dir_item)
+            parent_index = dir_item.index()
+            # La fila se pide al ítem: la vista puede haber reordenado el modelo
+            for rel_path, child in self._children[dir_rel_path]:
+                is_dir = child.is_dir
+                visible = dir_visible and self._is_entry_visible(base_prefix + rel_path, rel_path, is_dir)
+                if not visible:
+                    hidden.add(rel_path)
+                # Solo se toca la vista en las filas cuyo estado cambia
+                if visible == (rel_path in self._hidden_paths):
+                    self._view.setRowHidden(child.row(), parent_index, not visible)
+                if is_dir and rel_path in self._children:
+                    stack.append((rel_path, child, visible))
+        self._hidden_paths = hidden
+
+        # El estado de cada carpeta depende de sus hijos visibles: recalcular de abajo arriba
+        for dir_item in reversed(loaded_folders):
+            self._calculate_and_set_folder_state_from_children(dir_item)
+
+    def _build_directory_rows(
+        self,
+        abs_dir_path: str | os.PathLike[str],
+        rel_path_context: str,
+        stack: list,
+    ) -> list:
+        """Crea los ítems visibles de una carpeta, sin insertarlos en el modelo.
 
+        Las subcarpetas con archivos seleccionados se apilan en stack para cargarlas
+        también; las demás reciben un hijo marcador.
+        """
+        rows: List[Tuple[str, TreeItem]] = []
+        self._children[rel_path_context] = rows
+        # os.scandir devuelve el tipo de cada entrada junto con su nombre,
+        # sin un stat adicional por entrada como listdir + is_dir
         sortable_entries = []
-        for name in all_names_in_dir:
-            current_abs_path_entry = abs_dir_path / name
-            try:
-                is_entry_dir = current_abs_path_entry.is_dir() 
-                sortable_entries.append({'name': name, 'is_dir': is_entry_dir, 'abs_path': current_abs_path_entry})
-            except OSError: 
-                continue 
+        try:
+            with os.scandir(abs_dir_path) as it:
+                for dir_entry in it:
+                    try:
+                        is_entry_dir = dir_entry.is_dir()
+                    except OSError: 
+                        continue 
+                    # La tupla ya se ordena como se muestra: carpetas primero y por nombre
+                    name = dir_entry.name
+                    sortable_entries.append((not is_entry_dir, name.lower(), name, is_entry_dir, dir_entry.path))
+        except OSError:
+            # Sin permiso, o la carpeta desapareció desde que se listó su padre
+            return rows
         
-        sortable_entries.sort(key=lambda e: (not e['is_dir'], e['name'].lower()))
-
-        for entry in sortable_entries:
-            name = entry['name']
-            is_dir = entry['is_dir']
-            current_abs_path = entry['abs_path']
-            
-            current_rel_path = str(Path(rel_path_context, name)) if rel_path_context else name
+        sortable_entries.sort()
+
+        # Prefijo de las rutas relativas calculado una sola vez por carpeta
+        rel_prefix = rel_path_context + os.sep if rel_path_context else ""
+        intern = sys.intern
+
+        # Una cadena de carpetas con una sola subcarpeta se muestra como un único
+        # nodo "a/b/c" que representa a la más profunda. Averiguarlo exige listar
+        # cada subcarpeta; solo en carpetas enormes se reparten los listados entre
+        # hilos (scandir libera el GIL). Las carpetas van primero en sortable_entries
+        chains = [
+            (abs_path, rel_prefix + name, name)
+            for _, _, name, is_dir, abs_path in sortable_entries if is_dir
+        ]
+        if len(chains) < COMPACT_MIN_PARALLEL:
+            compacted = iter(_compact_directory_chains(chains))
+        else:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=SCAN_WORKERS)
+            chunk = max(COMPACT_BLOCK_SIZE, -(-len(chains) // SCAN_WORKERS))
+            blocks = self._executor.map(
+                _compact_directory_chains, (chains[i:i + chunk] for i in range(0, len(chains), chunk)))
+            compacted = (chain for block in blocks for chain in block)
+
+        for _, _, name, is_dir, current_abs_path in sortable_entries:
+            if is_dir:
+                current_abs_path, current_rel_path, name = next(compacted)
+            else:
+                current_rel_path = rel_prefix + name
+            current_rel_path = intern(current_rel_path)
 
-            is_item_visible = self._is_visible(current_rel_path) if self._is_visible else True
-            if not is_item_visible and is_dir:
-                if not self._has_visible_descendants(current_abs_path, current_rel_path):
+            if not self._is_entry_visible(current_abs_path, current_rel_path, is_dir):
+                if self._view is None:
                     continue
-            elif not is_item_visible: 
-                continue
+                # Se conserva oculto para mostrarlo sin reconstruir si cambian los filtros
+                self._hidden_paths.add(current_rel_path)
 
             display_name = f"[{name}]" if is_dir else name
-            ui_item = QStandardItem(display_name)
-            
-            ui_item.setData(current_rel_path, Qt.ItemDataRole.UserRole) 
+            ui_item = TreeItem(display_name, is_dir, current_rel_path)
             ui_item.setCheckable(True)
-            ui_item.setData(is_dir, IS_DIRECTORY_ROLE) 
-            
-            parent_ui_item.appendRow(ui_item) 
 
+            # El ítem se completa antes de insertarlo para no emitir itemChanged
             if is_dir:
-                self._add_directory_items(ui_item, current_abs_path, rel_path_context=current_rel_path)
-                self._calculate_and_set_folder_state_from_children(ui_item)
+                if current_rel_path in self._selected_dirs:
+                    stack.append((ui_item, current_abs_path, current_rel_path))
+                else:
+                    # Sin selecciones dentro: carga diferida, el marcador muestra la flecha de expansión
+                    ui_item.setCheckState(Qt.CheckState.Unchecked)
+                    ui_item.appendRow(QStandardItem())
             else: # Es un archivo
                 if current_rel_path in self._selected_paths:
                     ui_item.setCheckState(Qt.CheckState.Checked)
                 else:
                     ui_item.setCheckState(Qt.CheckState.Unchecked)
+            
+            rows.append((current_rel_path, ui_item))
 
-    def _calculate_and_set_folder_state_from_children(self, folder_item: QStandardItem) -> None:
-        if not folder_item.data(IS_DIRECTORY_ROLE): 
-            return
+        return rows
 
-        num_children = folder_item.rowCount()
-        if num_children == 0: 
-            folder_item.setCheckState(Qt.CheckState.Unchecked)
-            return
+    def _calculate_and_set_folder_state_from_children(self, folder_item: QStandardItem) -> bool:
+        """Recalcula el estado de una carpeta a partir de sus hijos; devuelve True si cambió."""
+        if not folder_item.is_dir: 
+            return False
 
+        # Solo cuentan los hijos visibles
+        num_children = 0
         checked_children = 0
         partially_checked_children = 0
-        for i in range(num_children):
-            child = folder_item.child(i)
-            if child is None: continue
+        checked = Qt.CheckState.Checked
+        partially_checked = Qt.CheckState.PartiallyChecked
+        hidden_paths = self._hidden_paths
+        # Una carpeta sin cargar solo tiene el marcador y queda sin marcar
+        for rel_path, child in self._children.get(folder_item.rel_path, ()):
+            if rel_path in hidden_paths: continue
+            num_children += 1
             
             state = child.checkState()
-            if state == Qt.CheckState.Checked:
+            if state == checked:
                 checked_children += 1
-            elif state == Qt.CheckState.PartiallyChecked:
+            elif state == partially_checked:
                 partially_checked_children += 1
         
         current_state = folder_item.checkState()
         new_state = current_state
 
-        if checked_children == num_children:
+        if num_children == 0:
+            new_state = Qt.CheckState.Unchecked
+        elif checked_children == num_children:
             new_state = Qt.CheckState.Checked
         elif checked_children == 0 and partially_checked_children == 0:
             new_state = Qt.CheckState.Unchecked
@@ -170,12 +399,8 @@ class TreeManager:
         
         if new_state != current_state:
             folder_item.setCheckState(new_state)
-
-    def _update_ancestor_states_after_population(self, item: QStandardItem) -> None:
-        parent = item.parent()
-        while parent is not None and parent != self._model.invisibleRootItem():
-            self._calculate_and_set_folder_state_from_children(parent)
-            parent = parent.parent()
+            return True
+        return False
 
     # ------------------------------------------------------------------
     # PRIVATE HELPERS (Selección y Visibilidad)
@@ -183,29 +408,56 @@ class TreeManager:
     def _prune_nonexistent_selections(self) -> None:
         if self._base_path is None:
             return
-        valid_selected_files: Set[str] = set()
-        for rel_file_path in list(self._selected_paths): 
-            full_path = self._base_path / rel_file_path
-            if full_path.is_file(): 
-                valid_selected_files.add(rel_file_path)
-        self._selected_paths = valid_selected_files
-
-
-    def _has_visible_descendants(self, abs_dir_path: Path, base_rel_path_of_dir: str) -> bool:
-        if self._is_visible is None:
-            for _, _, files in os.walk(abs_dir_path):
-                if files: return True 
-            return False
-
-        for root, _, files in os.walk(abs_dir_path):
-            for f_name in files:
-                abs_file_path = Path(root) / f_name
-                try:
-                    rel_to_treemanager_base = str(abs_file_path.relative_to(self._base_path))
-                    if self._is_visible(rel_to_treemanager_base):
-                        return True
-                except ValueError: 
-                    pass 
+        base_prefix = os.path.join(self._base_path, "")
+        isfile = os.path.isfile
+        # En su sitio: el conjunto es compartido con la configuración
+        self._selected_paths.difference_update([
+            rel_file_path for rel_file_path in self._selected_paths
+            if not isfile(base_prefix + rel_file_path)
+        ])
+
+
+    def _is_entry_visible(self, abs_path: str | os.PathLike[str], rel_path: str, is_dir: bool) -> bool:
+        """Indica si una entrada pasa los filtros; una carpeta también si contiene algo visible."""
+        if self._is_visible is None or self._is_visible(rel_path):
+            return True
+        return bool(is_dir) and self._has_visible_descendants(abs_path, rel_path)
+
+    def _has_visible_descendants(self, abs_dir_path: str | os.PathLike[str], base_rel_path_of_dir: str) -> bool:
+        cached = self._descendants_cache.get(base_rel_path_of_dir)
+        if cached is not None:
+            return cached
+
+        # Las rutas relativas se obtienen recortando el prefijo de la base,
+        # sin objetos Path ni relative_to por archivo
+        base_prefix = os.path.join(self._base_path, "")
+        is_visible = self._is_visible
+
+        # Una carpeta que el filtro no muestra no contiene nada visible (el filtro
+        # considera visibles los ancestros de cada archivo visible): no se entra en ella
+        def descend(dir_entry: os.DirEntry) -> bool:
+            return is_visible is None or is_visible(dir_entry.path[len(base_prefix):])
+
+        for entry in walk_fast(abs_dir_path, descend):
+            try:
+                # Igual que os.walk: los enlaces a directorios no cuentan como archivos
+                if entry.is_dir():
+                    continue
+            except OSError:
+                pass
+            entry_path = entry.path
+            if not entry_path.startswith(base_prefix):
+                continue
+            rel_file_path = entry_path[len(base_prefix):]
+            if is_visible is None or is_visible(rel_file_path):
+                # Todas las carpetas entre esta y el archivo contienen algo visible
+                parent = os.path.dirname(rel_file_path)
+                while parent and parent != base_rel_path_of_dir:
+                    self._descendants_cache[parent] = True
+                    parent = os.path.dirname(parent)
+                self._descendants_cache[base_rel_path_of_dir] = True
+                return True
+        self._descendants_cache[base_rel_path_of_dir] = False
         return False
 
     # ------------------------------------------------------------------
@@ -216,72 +468,124 @@ class TreeManager:
         if not item.isCheckable():
             return
 
-        rel_path = item.data(Qt.ItemDataRole.UserRole)
-        is_dir = item.data(IS_DIRECTORY_ROLE) 
+        rel_path = item.rel_path
+        is_dir = item.is_dir
         new_check_state = item.checkState()
 
         # El estado del 'item' ya fue cambiado por la UI antes de que este handler sea llamado.
         # Ahora necesitamos propagar este cambio a _selected_paths y a los hijos/padres en la UI.
 
         if new_check_state == Qt.CheckState.Checked:
-            self._apply_selection_recursive(item, rel_path, is_dir, True)
+            self._apply_selection(item, rel_path, is_dir, True)
         elif new_check_state == Qt.CheckState.Unchecked:
-            self._apply_selection_recursive(item, rel_path, is_dir, False)
+            self._apply_selection(item, rel_path, is_dir, False)
         
         self._update_parent_state(item) # Actualizar estado visual de los padres
 
-    def _apply_selection_recursive(self, item: QStandardItem, rel_path: str, is_dir: bool, select: bool):
+    def _apply_selection(self, item: QStandardItem, rel_path: str, is_dir: bool, select: bool):
         """
         Aplica el estado de selección (select=True para marcar, False para desmarcar)
         al ítem y sus descendientes, actualizando _selected_paths para archivos.
         También actualiza el checkState de la UI para los ítems afectados.
+        Recorre el subárbol con una pila explícita, sin recursión.
         """
         target_state = Qt.CheckState.Checked if select else Qt.CheckState.Unchecked
 
-        # Actualizar _selected_paths para el ítem actual si es un archivo
-        if not is_dir: # Es un archivo
+        # Los archivos afectados se acumulan y _selected_paths se actualiza
+        # de una vez al final, con una operación de conjuntos
+        file_paths: List[str] = []
+        stack = [(item, rel_path, is_dir)]
+        while stack:
+            node, node_rel_path, node_is_dir = stack.pop()
+
+            if not node_is_dir:
+                file_paths.append(node_rel_path)
+
+            # Asegurar que el estado visual sea el correcto. El del item clickeado
+            # ya cambió antes de llamar a `handle_item_changed`; el de los hijos lo cambiamos aquí.
+            if node.checkState() != target_state:
+                node.setCheckState(target_state) # Actualiza UI, pero la señal principal está desconectada
+
+            if not node_is_dir:
+                continue
+
+            # Al marcar una carpeta sin cargar hay que conocer sus archivos;
+            # al desmarcarla no, porque una carpeta sin cargar no tiene selecciones
             if select:
-                self._selected_paths.add(rel_path)
-            else:
-                self._selected_paths.discard(rel_path)
-        
-        # Asegurar que el estado visual del ítem actual sea el correcto
-        # Esto es importante porque `handle_item_changed` se llama *después* de que el estado del item
-        # clickeado ya cambió. Para los hijos, necesitamos cambiarlo nosotros.
-        if item.checkState() != target_state:
-             item.setCheckState(target_state) # Actualiza UI, pero la señal principal está desconectada
-
-        # Si es un directorio, aplicar recursivamente a los hijos
-        if is_dir:
-            for i in range(item.rowCount()):
-                child = item.child(i)
-                child_rel_path = child.data(Qt.ItemDataRole.UserRole)
-                child_is_dir = child.data(IS_DIRECTORY_ROLE)
-                
-                # Llamada recursiva para procesar al hijo
-                # No solo cambiamos su checkState, sino que llamamos a la lógica completa
-                # para asegurar que _selected_paths se actualice para sub-archivos.
-                self._apply_selection_recursive(child, child_rel_path, child_is_dir, select)
+                self.fetch_children(node)
 
+            for child_rel_path, child in self._children.get(node_rel_path, ()):
+                if child_rel_path in self._hidden_paths: # Filtrado: no se selecciona
+                    continue
+                stack.append((child, child_rel_path, child.is_dir))
+
+        if select:
+            self._selected_paths.update(file_paths)
+        else:
+            self._selected_paths.difference_update(file_paths)
 
     def _update_parent_state(self, item: QStandardItem) -> None:
         """Actualiza el estado de check del padre de 'item' y sus ancestros."""
         parent = item.parent()
-        if parent is None or parent == self._model.invisibleRootItem():
-            return
-        
-        # El estado del padre se calcula y se establece.
-        # Si setCheckState aquí dispara itemChanged, el guardián en main_window lo maneja.
-        self._calculate_and_set_folder_state_from_children(parent)
-        
-        # Propagar hacia arriba recursivamente
-        self._update_parent_state(parent) 
+        while parent is not None and parent != self._root:
+            # Si setCheckState aquí dispara itemChanged, el guardián en main_window lo maneja.
+            # El estado de una carpeta solo depende del de sus hijos: si este padre
+            # no cambia, tampoco cambia ninguno de los ancestros superiores
+            if not self._calculate_and_set_folder_state_from_children(parent):
+                break
+            parent = parent.parent()
 
     # ------------------------------------------------------------------
     # OTHER PUBLIC UTILITIES
     # ------------------------------------------------------------------
+    def shutdown(self) -> None:
+        """Libera los hilos de trabajo, si llegaron a crearse (al cerrar la aplicación)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
     def reset_selection(self) -> None:
         """Deselecciona todos los ítems y limpia _selected_paths."""
         self._selected_paths.clear()
-        if self._base_path: 
-             self.populate_tree() # Repoblar asegura UI limpia y estados de carpeta correctos
\ No newline at end of file
+        # Sin selección todos los estados son Unchecked: basta con desmarcar los
+        # ítems ya cargados, sin volver a leer el disco ni recrear el modelo
+        unchecked = Qt.CheckState.Unchecked
+        base_folder_item = self._model.item(0)
+        if base_folder_item is None:
+            return
+        if base_folder_item.checkState() != unchecked:
+            base_folder_item.setCheckState(unchecked)
+        # Cada ítem cargado figura en el índice de su carpeta: se recorren las
+        # listas tal cual, sin descender por el árbol
+        for rows in self._children.values():
+            for _, child in rows:
+                if child.checkState() != unchecked:
+                    child.setCheckState(unchecked)
+
+
+def _compact_directory_chain(abs_path: str, rel_path: str, display_name: str) -> Tuple[str, str, str]:
+    """Sigue una carpeta mientras su único contenido sea otra carpeta.
+
+    Devuelve las rutas de la última carpeta de la cadena y el nombre a mostrar,
+    con los segmentos unidos por "/". Los enlaces simbólicos no se siguen, para
+    no entrar en ciclos.
+    """
+    while True:
+        try:
+            with os.scandir(abs_path) as it:
+                only_entry = next(it, None)
+                if only_entry is None or next(it, None) is not None:
+                    break
+            if not only_entry.is_dir() or only_entry.is_symlink():
+                break
+        except OSError:
+            break
+        abs_path = only_entry.path
+        rel_path = rel_path + os.sep + only_entry.name
+        display_name = display_name + "/" + only_entry.name
+    return abs_path, rel_path, display_name
+
+
+def _compact_directory_chains(chains: List[Tuple[str, str, str]]) -> List[Tuple[str, str, str]]:
+    """Aplica _compact_directory_chain a un bloque de carpetas, en el mismo orden."""
+    return [_compact_directory_chain(*chain) for chain in chains]